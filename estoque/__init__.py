@@ -0,0 +1 @@
+"""Núcleo do sistema de estoque: armazenamento, log e regras de negócio."""
@@ -0,0 +1,400 @@
+"""Backends de armazenamento do cadastro de produtos.
+
+Todos expõem a mesma API baseada em DataFrame:
+
+- ``carregar()`` devolve o cadastro; o índice identifica a linha (rowid no
+  SQLite, posição no CSV).
+- ``salvar(df, base=None)`` grava ``df``. Com ``base`` (o frame como foi
+  carregado) só as células que mudaram em relação a ela são escritas, cada
+  uma só se o arquivo ainda tiver o valor de ``base`` (senão sai
+  ``ConflitoGravacao``, ver ``estoque.concorrencia``), então duas sessões que
+  editam o mesmo cadastro não apagam o trabalho uma da outra.
+  Linhas com rótulo negativo (ver ``anexar``) são inseridas; rótulos da base
+  que sumiram de ``df`` são excluídos.
+- ``versao()`` muda a cada gravação; serve de chave para caches derivados.
+- ``carregar_versionado()`` devolve (versão, cadastro) lidos juntos. O SQLite
+  também tem ``alteracoes(desde)``: só as linhas gravadas depois da versão
+  ``desde`` e os ids excluídos, para quem já tem uma cópia em memória.
+- ``unidades()`` devolve o ``RegistroUnidades``; ``adicionar_unidade(u)``
+  cadastra uma unidade nova, que aparece no cadastro com saldo zero.
+
+O cadastro chega sempre na visão larga (``Estoque_<codigo>``/``Min_<codigo>``
+por unidade). No SQLite os saldos ficam numa tabela longa ``saldos``
+(produto, unidade, estoque, mínimo) e a visão larga é montada na leitura;
+no CSV as colunas das unidades novas são acrescentadas ao carregar.
+"""
+import json
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .esquema import alinhar_categorias, aplicar_esquema
+from .concorrencia import ConflitoGravacao, TravaArquivo, conflitos
+from .metricas import medido
+from .unidades import REGISTRO_PADRAO, RegistroUnidades, gravar_registro_csv, ler_registro_csv
+
+COLUNAS_PRODUTO = [
+    "Codigo", "Codigo_Unico", "Produto", "Produto_Alt",
+    "Categoria", "Fornecedor", "Padrao", "Custo",
+]
+COLUNAS_TEXTO = ["Codigo", "Codigo_Unico", "Produto", "Produto_Alt", "Categoria", "Fornecedor", "Padrao"]
+VERSAO_ATUAL = "(SELECT valor FROM controle WHERE chave = 'versao')"
+
+
+def colunas_cadastro(unidades=REGISTRO_PADRAO):
+    """Colunas da visão larga: as do produto e, por unidade, mínimo (hospitais) e estoque."""
+    return COLUNAS_PRODUTO + unidades.colunas_saldo()
+
+
+COLUNAS = colunas_cadastro()
+
+
+def anexar(df, linhas):
+    """Acrescenta produtos novos com rótulos negativos, que ``salvar`` trata como INSERT."""
+    novos = linhas.reset_index(drop=True) if isinstance(linhas, pd.DataFrame) else pd.DataFrame(linhas)
+    if novos.empty: return df
+    inicio = min(0, int(df.index.min())) if len(df) else 0
+    novos.index = pd.RangeIndex(inicio - 1, inicio - 1 - len(novos), -1)
+    return pd.concat([df, novos]) if len(df) else novos.reindex(columns=df.columns.union(novos.columns, sort=False))
+
+
+def _valor_sql(v):
+    if v is None or (not isinstance(v, str) and pd.isna(v)): return None
+    if isinstance(v, np.float32): return float(str(v))   # 1.15, não 1.149999976
+    return v.item() if hasattr(v, "item") else v
+
+
+def _diferencas(df, base, colunas=COLUNAS):
+    """(inserir, atualizar, excluir) de ``df`` em relação a ``base``.
+
+    ``atualizar`` é uma lista de (rótulo, {coluna: (valor novo, valor em base)}) só com as células alteradas.
+    """
+    cols = [c for c in colunas if c in df.columns]
+    novos = df.index.difference(base.index)
+    excluir = base.index.difference(df.index)
+    comuns = df.index.intersection(base.index)
+    atualizar = []
+    if len(comuns) and cols:
+        a = df.loc[comuns, cols]
+        b = base.loc[comuns, [c for c in cols if c in base.columns]].reindex(columns=cols)
+        a, b = alinhar_categorias(a, b)
+        mudou = (a != b) & ~(a.isna() & b.isna())
+        linhas = mudou.any(axis=1)
+        for rot, flags in mudou[linhas].iterrows():
+            atualizar.append((rot, {c: (a.at[rot, c], b.at[rot, c]) for c in cols if flags[c]}))
+    return df.loc[novos], atualizar, excluir
+
+
+# =================================================================================
+# CSV (formato original)
+# =================================================================================
+class ArmazenamentoCSV:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.caminho_unidades = os.path.splitext(caminho)[0] + "_unidades.csv"
+
+    def unidades(self):
+        return ler_registro_csv(self.caminho_unidades)
+
+    @medido()
+    def carregar(self):
+        unidades = self.unidades()
+        if not os.path.exists(self.caminho):
+            df = pd.DataFrame(columns=colunas_cadastro(unidades))
+            df.to_csv(self.caminho, index=False)
+            return df
+        try: df = pd.read_csv(self.caminho)
+        except Exception: return pd.DataFrame(columns=colunas_cadastro(unidades))
+        faltam = [c for c in unidades.colunas_saldo() if c not in df.columns]
+        return aplicar_esquema(df.assign(**dict.fromkeys(faltam, 0)) if faltam else df)
+
+    @medido()
+    def salvar(self, df, base=None):
+        with TravaArquivo(self.caminho + ".lock"):
+            if base is not None: df = self._mesclar(df, base)
+            tmp = self.caminho + ".tmp"
+            df.to_csv(tmp, index=False)
+            os.replace(tmp, self.caminho)
+
+    def _mesclar(self, df, base):
+        """Diferenças de ``df`` para ``base`` aplicadas sobre o arquivo atual (o rótulo é a posição da linha)."""
+        atual = self.carregar()
+        inserir, atualizar, excluir = _diferencas(df, base, list(df.columns))
+        celulas = [(rot, c, lido, novo) for rot, mud in atualizar for c, (novo, lido) in mud.items()]
+        # a linha só é a mesma se o produto na posição for o mesmo
+        tocadas = pd.Index([rot for rot, _ in atualizar]).append(excluir)
+        celulas += [(rot, "Produto", base.at[rot, "Produto"], base.at[rot, "Produto"]) for rot in tocadas if "Produto" in base.columns]
+        conf = conflitos(celulas, atual)
+        if len(conf): raise ConflitoGravacao(conf)
+        for rot, c, _, novo in celulas:
+            try: atual.loc[rot, c] = novo
+            except (TypeError, ValueError):
+                atual[c] = atual[c].astype(object); atual.loc[rot, c] = novo
+        return pd.concat([atual.drop(index=excluir), inserir]).reset_index(drop=True)
+
+    def versao(self):
+        try: return os.stat(self.caminho).st_mtime_ns
+        except OSError: return 0
+
+    def carregar_versionado(self):
+        versao = self.versao()
+        return versao, self.carregar()
+
+    def adicionar_unidade(self, unidade):
+        gravar_registro_csv(self.unidades().adicionar(unidade), self.caminho_unidades)
+        if os.path.exists(self.caminho): os.utime(self.caminho)
+
+
+# =================================================================================
+# SQLITE (WAL, updates por linha)
+# =================================================================================
+class ArmazenamentoSQLite:
+    TABELA = "produtos"
+
+    def __init__(self, caminho, unidades=REGISTRO_PADRAO):
+        self.caminho = caminho
+        self.unidades_iniciais = unidades   # registro gravado num banco que ainda não tem unidades
+        self._pronto = False
+
+    @contextmanager
+    def conexao(self):
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        try:
+            if not self._pronto: self._criar_schema(con)
+            yield con
+        finally:
+            con.close()
+
+    def _criar_schema(self, con):
+        con.execute("PRAGMA journal_mode=WAL")
+        defs = ", ".join(f'"{c}" {"TEXT" if c in COLUNAS_TEXTO else "REAL DEFAULT 0"}' for c in COLUNAS_PRODUTO)
+        con.execute(f"CREATE TABLE IF NOT EXISTS {self.TABELA} (id INTEGER PRIMARY KEY AUTOINCREMENT, {defs})")
+        for c in ("Produto", "Codigo", "Codigo_Unico"):
+            con.execute(f'CREATE INDEX IF NOT EXISTS ix_{self.TABELA}_{c.lower()} ON {self.TABELA}("{c}")')
+        con.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor INTEGER)")
+        con.execute("INSERT OR IGNORE INTO controle VALUES ('versao', 0)")
+        # versão da última gravação de cada linha e ids excluídos: base de ``alteracoes``
+        existentes = {r[1] for r in con.execute(f"PRAGMA table_info({self.TABELA})")}
+        if "versao_linha" not in existentes:
+            con.execute(f"ALTER TABLE {self.TABELA} ADD COLUMN versao_linha INTEGER DEFAULT 0")
+        con.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.TABELA}_versao_linha ON {self.TABELA}(versao_linha)")
+        con.execute("CREATE TABLE IF NOT EXISTS excluidos (id INTEGER PRIMARY KEY, versao INTEGER)")
+        # saldos por (produto, unidade); célula ausente vale zero
+        con.execute("CREATE TABLE IF NOT EXISTS unidades (codigo TEXT PRIMARY KEY, nome TEXT, central INTEGER, palavras TEXT, curto TEXT, ordem INTEGER)")
+        con.execute("CREATE TABLE IF NOT EXISTS saldos (produto INTEGER, unidade TEXT, estoque REAL DEFAULT 0, minimo REAL DEFAULT 0, "
+                    "versao_linha INTEGER DEFAULT 0, PRIMARY KEY (produto, unidade)) WITHOUT ROWID")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_saldos_versao_linha ON saldos(versao_linha)")
+        if con.execute("SELECT 1 FROM unidades LIMIT 1").fetchone() is None:
+            self._gravar_unidades(con, self.unidades_iniciais)
+        self._migrar_saldos_largos(con)
+        self._pronto = True
+
+    def _gravar_unidades(self, con, registro):
+        con.executemany("INSERT OR IGNORE INTO unidades VALUES (?, ?, ?, ?, ?, ?)",
+                        [tuple(r) + (i,) for i, r in enumerate(registro.frame().itertuples(index=False, name=None))])
+
+    def _migrar_saldos_largos(self, con):
+        """Bancos do formato antigo (Estoque_*/Min_* em ``produtos``): copia para ``saldos`` e remove as colunas."""
+        def largas(): return [r[1] for r in con.execute(f"PRAGMA table_info({self.TABELA})") if r[1].startswith(("Estoque_", "Min_"))]
+        if not largas(): return
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            cols = largas()
+            for u in self._unidades(con):
+                est = f'COALESCE("{u.coluna_estoque}", 0)' if u.coluna_estoque in cols else "0"
+                mn = f'COALESCE("{u.coluna_minimo}", 0)' if not u.central and u.coluna_minimo in cols else "0"
+                if est == mn == "0": continue
+                con.execute(f"INSERT OR REPLACE INTO saldos SELECT id, ?, {est}, {mn}, versao_linha FROM {self.TABELA} "
+                            f"WHERE {est} != 0 OR {mn} != 0", (u.codigo,))
+                for c in (u.coluna_estoque, u.coluna_minimo):
+                    if c in cols: con.execute(f'ALTER TABLE {self.TABELA} DROP COLUMN "{c}"')
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def transacao(self):
+        with self.conexao() as con:
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                # a versão nova já vale dentro da transação: as linhas gravadas levam VERSAO_ATUAL
+                con.execute("UPDATE controle SET valor = valor + 1 WHERE chave = 'versao'")
+                yield con
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+
+    def _unidades(self, con):
+        return RegistroUnidades.de_frame(pd.read_sql_query("SELECT codigo, nome, central, palavras, curto FROM unidades ORDER BY ordem", con))
+
+    def _ler(self, con, ids="", params=()):
+        """Visão larga do cadastro. ``ids``: subconsulta que limita os produtos lidos (vazio = todos)."""
+        unidades = self._unidades(con)
+        nomes = ", ".join(f'"{c}"' for c in COLUNAS_PRODUTO)
+        df = pd.read_sql_query(f"SELECT id, {nomes} FROM {self.TABELA} {f'WHERE id IN ({ids})' if ids else ''} ORDER BY id",
+                               con, index_col="id", params=params)
+        df.index.name = None
+        s = pd.read_sql_query(f"SELECT produto, unidade, estoque, minimo FROM saldos {f'WHERE produto IN ({ids})' if ids else ''}",
+                              con, index_col=["produto", "unidade"], params=params)
+        cols = unidades.colunas_saldo()
+        if len(s):
+            s = s.unstack("unidade")
+            df = df.join(pd.concat([s["minimo"].add_prefix("Min_"), s["estoque"].add_prefix("Estoque_")], axis=1).reindex(columns=cols))
+        else: df = df.reindex(columns=COLUNAS_PRODUTO + cols)
+        return aplicar_esquema(df)
+
+    @medido()
+    def carregar(self):
+        with self.conexao() as con:
+            return self._ler(con)
+
+    def unidades(self):
+        with self.conexao() as con:
+            return self._unidades(con)
+
+    def adicionar_unidade(self, unidade):
+        """Cadastra a unidade. Nenhuma linha é reescrita: os saldos dela começam vazios (zero)."""
+        with self.transacao() as con:
+            self._gravar_unidades(con, self._unidades(con).adicionar(unidade))
+
+    def versao(self):
+        with self.conexao() as con:
+            return con.execute(f"SELECT {VERSAO_ATUAL}").fetchone()[0]
+
+    def carregar_versionado(self):
+        with self.conexao() as con:
+            con.execute("BEGIN")
+            try: return con.execute(f"SELECT {VERSAO_ATUAL}").fetchone()[0], self._ler(con)
+            finally: con.execute("COMMIT")
+
+    @medido()
+    def alteracoes(self, desde):
+        """(versão, linhas gravadas depois de ``desde``, ids excluídos depois de ``desde``), lidos no mesmo snapshot."""
+        with self.conexao() as con:
+            con.execute("BEGIN")
+            try:
+                versao = con.execute(f"SELECT {VERSAO_ATUAL}").fetchone()[0]
+                linhas = self._ler(con, f"SELECT id FROM {self.TABELA} WHERE versao_linha > ? "
+                                        "UNION SELECT produto FROM saldos WHERE versao_linha > ?", (desde, desde))
+                excluidos = pd.Index([r[0] for r in con.execute("SELECT id FROM excluidos WHERE versao > ?", (desde,))], dtype="int64")
+            finally: con.execute("COMMIT")
+        return versao, linhas, excluidos
+
+    @medido()
+    def salvar(self, df, base=None):
+        """Grava as diferenças de ``df`` para ``base`` numa transação, com compare-and-swap por célula."""
+        if base is None: base = self.carregar()
+        unidades = self.unidades()
+        # coluna larga -> (campo de ``saldos``, unidade)
+        celulas = {u.coluna_estoque: ("estoque", u.codigo) for u in unidades}
+        celulas.update({u.coluna_minimo: ("minimo", u.codigo) for u in unidades.destinos})
+        inserir, atualizar, excluir = _diferencas(df, base, colunas_cadastro(unidades))
+        if not (len(inserir) or atualizar or len(excluir)): return 0, 0, 0
+        with self.transacao() as con:
+            if len(excluir):
+                ids = [(int(i),) for i in excluir]
+                con.executemany(f"DELETE FROM {self.TABELA} WHERE id = ?", ids)
+                con.executemany("DELETE FROM saldos WHERE produto = ?", ids)
+                con.executemany(f"INSERT OR REPLACE INTO excluidos VALUES (?, {VERSAO_ATUAL})", ids)
+            if atualizar:
+                # compare-and-swap: com a transação IMMEDIATE ninguém grava entre a conferência e os UPDATEs
+                atual = self._ler(con, "SELECT value FROM json_each(?)", (json.dumps([int(r) for r, _ in atualizar]),))
+                conf = conflitos([(rot, c, lido, novo) for rot, mud in atualizar for c, (novo, lido) in mud.items()], atual)
+                if len(conf): raise ConflitoGravacao(conf)
+            # um executemany por coluna
+            por_coluna = {}
+            for rot, mud in atualizar:
+                for c, (novo, _) in mud.items(): por_coluna.setdefault(c, []).append((int(rot), _valor_sql(novo)))
+            for c, params in por_coluna.items():
+                if c in celulas:
+                    campo, codigo = celulas[c]
+                    con.executemany(f"INSERT INTO saldos (produto, unidade, {campo}, versao_linha) VALUES (?, ?, ?, {VERSAO_ATUAL}) "
+                                    f"ON CONFLICT (produto, unidade) DO UPDATE SET {campo} = excluded.{campo}, versao_linha = excluded.versao_linha",
+                                    [(r, codigo, 0.0 if n is None else n) for r, n in params])
+                else:
+                    con.executemany(f'UPDATE {self.TABELA} SET "{c}" = ?, versao_linha = {VERSAO_ATUAL} WHERE id = ?', [(n, r) for r, n in params])
+            if len(inserir): self._inserir(con, inserir, unidades)
+        return len(inserir), len(atualizar), len(excluir)
+
+    def _inserir(self, con, df, unidades):
+        cols = [c for c in COLUNAS_PRODUTO if c in df.columns]
+        nomes = ", ".join(f'"{c}"' for c in cols)
+        marcas = ", ".join("?" for _ in cols)
+        # ids explícitos, a partir do maior já usado: os saldos são gravados com eles em seguida
+        inicio = con.execute(f"SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{self.TABELA}'), 0), "
+                             f"COALESCE((SELECT MAX(id) FROM {self.TABELA}), 0))").fetchone()[0]
+        ids = np.arange(inicio + 1, inicio + 1 + len(df), dtype="int64")
+        valores = df[cols].astype(object).itertuples(index=False, name=None)
+        con.executemany(f"INSERT INTO {self.TABELA} (id, {nomes}, versao_linha) VALUES (?, {marcas}, {VERSAO_ATUAL})",
+                        ([int(i)] + [_valor_sql(v) for v in linha] for i, linha in zip(ids, valores)))
+        zero = pd.Series(0.0, index=df.index)
+        def num(c): return pd.to_numeric(df[c], errors="coerce").fillna(0).astype(float) if c in df.columns else zero
+        for u in unidades:
+            est, mn = num(u.coluna_estoque), zero if u.central else num(u.coluna_minimo)
+            m = ((est != 0) | (mn != 0)).to_numpy()
+            con.executemany(f"INSERT INTO saldos VALUES (?, ?, ?, ?, {VERSAO_ATUAL})",
+                            zip(ids[m].tolist(), [u.codigo] * int(m.sum()), est.to_numpy()[m].tolist(), mn.to_numpy()[m].tolist()))
+
+    def substituir(self, df):
+        with self.transacao() as con:
+            con.execute(f"INSERT OR REPLACE INTO excluidos SELECT id, {VERSAO_ATUAL} FROM {self.TABELA}")
+            con.execute(f"DELETE FROM {self.TABELA}")
+            con.execute("DELETE FROM saldos")
+            self._inserir(con, df, self._unidades(con))
+
+
+def abrir_banco(motor, caminho):
+    if motor == "sqlite": return ArmazenamentoSQLite(caminho)
+    if motor == "csv": return ArmazenamentoCSV(caminho)
+    raise ValueError(f"Motor de banco desconhecido: {motor}")
+
+
+# =================================================================================
+# MIGRAÇÃO CSV -> SQLITE
+# =================================================================================
+def _remover_sqlite(caminho):
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo): os.remove(caminho + sufixo)
+
+
+def migrar_csv_para_sqlite(arquivo_csv, arquivo_db):
+    """Copia o cadastro do CSV para um banco SQLite novo. Retorna o nº de linhas migradas.
+
+    O banco é montado em ``arquivo_db + ".tmp"`` e só passa a ser ``arquivo_db`` depois de gravado
+    por inteiro: um processo morto no meio da migração não deixa no lugar um banco só com o schema.
+    """
+    if os.path.exists(arquivo_db): raise FileExistsError(arquivo_db)
+    unidades = ArmazenamentoCSV(arquivo_csv).unidades()
+    colunas = colunas_cadastro(unidades)
+    df = pd.read_csv(arquivo_csv, dtype={c: str for c in COLUNAS_TEXTO})
+    df = df.reindex(columns=colunas)
+    for c in colunas:
+        if c not in COLUNAS_TEXTO: df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+    temporario = arquivo_db + ".tmp"
+    _remover_sqlite(temporario)   # sobra de uma migração interrompida
+    banco = ArmazenamentoSQLite(temporario, unidades)
+    try:
+        banco.substituir(df)
+        # tudo no arquivo principal antes de renomear (o -wal não acompanha o os.replace)
+        with banco.conexao() as con: con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except BaseException:
+        _remover_sqlite(temporario)
+        raise
+    for sufixo in ("-wal", "-shm"):
+        if os.path.exists(arquivo_db + sufixo): os.remove(arquivo_db + sufixo)
+    os.replace(temporario, arquivo_db)
+    _remover_sqlite(temporario)
+    return len(df)
+
+
+if __name__ == "__main__":
+    origem = sys.argv[1] if len(sys.argv) > 1 else "banco_dados.csv"
+    destino = sys.argv[2] if len(sys.argv) > 2 else "banco_dados.db"
+    print(f"{migrar_csv_para_sqlite(origem, destino)} produtos migrados para {destino}")
@@ -0,0 +1,208 @@
+"""Benchmark dos caminhos quentes, sem a interface.
+
+Para cada tamanho de cadastro (1k, 10k e 100k produtos por padrão) monta um
+banco e um log sintéticos numa pasta temporária e mede, ``repeticoes`` vezes
+cada, as mesmas funções que as telas chamam:
+
+- ``carregar_dados``: leitura completa do cadastro (cache frio) e a
+  atualização incremental depois de gravar uma linha;
+- ``salvar``: gravar uma célula com ``gravar_com_repeticao``;
+- ``registrar_log``: 1 e 100 linhas num log que já tem ``n`` linhas;
+- importações de cadastro (``n/10`` linhas, metade nova) e de contagem (``n``
+  linhas, lidas de um CSV por ``PlanilhaContagem``);
+- ``transferencia``: validar + aplicar + gravar + registrar 100 itens;
+- ``compras``: sugestão de compra a frio;
+- ``criar_pdf_unificado`` e ``criar_pdf_pedido``.
+
+Os tempos vão para um CSV de métricas (tipo ``benchmark``, com a versão do
+código), o mesmo formato de ``estoque.metricas``: rodar de novo em outra versão
+acumula no arquivo e o relatório compara as medianas com a versão anterior.
+
+Uso: ``python -m estoque.benchmark [tamanhos=1000,10000,100000] [repeticoes=3] [sqlite|csv] [saida=benchmark.csv]``
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .armazenamento import abrir_banco
+from .cache import CacheCadastro
+from .compras import MotorSugestao
+from .concorrencia import gravar_com_repeticao
+from .documentos import criar_pdf_pedido, criar_pdf_unificado
+from .importacao import importar_cadastro, importar_contagem_em_blocos
+from .indice import IndiceProdutos
+from .log import LogEventos, nova_linha
+from .metricas import Metricas, comparar, resumo, versao_codigo
+from .planilhas import PlanilhaContagem
+from .transferencia import linhas_log, transferir
+from .unidades import REGISTRO_PADRAO
+
+TAMANHOS = (1000, 10000, 100000)
+REPETICOES = 3
+ITENS_TRANSFERENCIA = 100
+PALAVRAS = ("ÁGUA", "CAFÉ", "AÇÚCAR", "LEITE", "PÃO", "SUCO", "COPO", "PAPEL", "TOALHA", "DESCARTÁVEL", "MINERAL", "INTEGRAL")
+
+
+def cadastro_sintetico(n, semente=0):
+    """Cadastro com nomes, fornecedores e saldos variados (mais perto do real que o do teste de carga)."""
+    rnd = np.random.default_rng(semente)
+    nomes = pd.Series(rnd.choice(PALAVRAS, n)) + " " + pd.Series(rnd.choice(PALAVRAS, n)) + " " + pd.Series(np.arange(n)).map("{:06d}".format)
+    dados = {"Codigo": [f"{i:06d}" for i in range(n)], "Codigo_Unico": "", "Produto": nomes, "Produto_Alt": "",
+             "Categoria": rnd.choice(["Café", "Perecíveis", "Geral"], n), "Fornecedor": rnd.choice([f"FORNECEDOR {i:02d}" for i in range(40)], n),
+             "Padrao": rnd.choice(["Un", "Cx", "Pct"], n), "Custo": rnd.uniform(0.5, 50, n).round(2)}
+    for u in REGISTRO_PADRAO:
+        dados[u.coluna_estoque] = rnd.integers(500, 1000, n).astype(float) if u.central else rnd.integers(0, 50, n).astype(float)
+    for u in REGISTRO_PADRAO.destinos: dados[u.coluna_minimo] = rnd.integers(0, 60, n).astype(float)
+    return pd.DataFrame(dados)
+
+
+def log_sintetico(log, df, n, semente=0):
+    rnd = np.random.default_rng(semente)
+    destinos = [u.nome for u in REGISTRO_PADRAO.destinos]
+    produtos = df["Produto"].to_numpy()[rnd.integers(0, len(df), n)]
+    log.registrar(nova_linha(p, int(q), "Transferência", f"Central -> {d}")
+                  for p, q, d in zip(produtos, rnd.integers(1, 10, n), rnd.choice(destinos, n)))
+
+
+def planilha_cadastro(df, semente=0):
+    """Planilha do fornecedor com ``len(df)/10`` linhas: metade produtos existentes, metade novos."""
+    rnd = np.random.default_rng(semente)
+    m = max(len(df) // 10, 2)
+    existentes = df.iloc[rnd.integers(0, len(df), m // 2)]
+    novos = [f"NOVO PRODUTO {i:06d}" for i in range(m - m // 2)]
+    return pd.DataFrame({"Código": list(existentes["Codigo"]) + [f"N{i:06d}" for i in range(len(novos))],
+                         "Produto 1": list(existentes["Produto"]) + novos, "Fornecedor": "FORNECEDOR 99", "Padrão": "Un",
+                         "Custo": rnd.uniform(1, 10, m).round(2), "Mín Amaro": rnd.integers(0, 20, m), "Mín Izabel": rnd.integers(0, 20, m)})
+
+
+def planilha_contagem(df, caminho, semente=0):
+    """CSV de contagem com uma linha por produto do cadastro (5% com nome novo)."""
+    rnd = np.random.default_rng(semente)
+    nomes = df["Produto"].astype(str).to_numpy(object)
+    novos = rnd.random(len(df)) < 0.05
+    nomes[novos] = [f"CONTADO {i:06d}" for i in range(int(novos.sum()))]
+    pd.DataFrame({"Código": np.where(novos, "", df["Codigo"].astype(str)), "Produto": nomes,
+                  "Qtd": rnd.integers(0, 50, len(df))}).to_csv(caminho, index=False)
+
+
+def _cronometrar(funcao, repeticoes, preparar=None):
+    """Segundos de cada repetição; ``preparar()`` roda fora do tempo e devolve os argumentos."""
+    tempos = []
+    for _ in range(repeticoes):
+        args = preparar() if preparar else ()
+        inicio = time.perf_counter()
+        funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def casos(n, motor, pasta):
+    """(nome, linhas, função, preparar) de cada caso, sobre um banco de ``n`` produtos criado em ``pasta``."""
+    caminho = os.path.join(pasta, "banco_dados.db" if motor == "sqlite" else "banco_dados.csv")
+    inicial = cadastro_sintetico(n)
+    banco = abrir_banco(motor, caminho)
+    if motor == "sqlite": banco.substituir(inicial)
+    else: banco.salvar(inicial)
+    log = LogEventos(os.path.join(pasta, "historico_log.csv"))
+    log_sintetico(log, inicial, n)
+    cache = CacheCadastro(banco)
+    rnd = np.random.default_rng(1)
+
+    def atual():
+        versao, frame = cache.obter()
+        return frame, cache.derivado(versao, frame, "indice", IndiceProdutos)
+
+    def editar_custo(df, versao, base):
+        df.loc[df.index[rnd.integers(0, len(df))], "Custo"] = round(float(rnd.uniform(1, 10)), 2)
+        return df, None
+
+    leitor = CacheCadastro(banco)
+    def preparar_incremental():
+        # o leitor fica uma versão atrás: obter() lê só a linha gravada
+        leitor.obter(); gravar_com_repeticao(banco, cache, editar_custo)
+        return ()
+
+    def preparar_importacao():
+        frame, indice = atual()
+        return frame.copy(deep=False), indice.copia()
+
+    cadastro_planilha = planilha_cadastro(inicial)
+    caminho_contagem = os.path.join(pasta, "contagem.csv")
+    planilha_contagem(inicial, caminho_contagem)
+    col_dest = REGISTRO_PADRAO.destinos[0].coluna_estoque
+
+    produtos = inicial["Produto"].to_numpy()
+    destinos = [u.nome for u in REGISTRO_PADRAO.destinos]
+    def carga():
+        escolhidos = rnd.choice(len(produtos), min(ITENS_TRANSFERENCIA, len(produtos)), replace=False)
+        return [{"Destino": destinos[i % len(destinos)], "Produto": produtos[j], "Quantidade": 1} for i, j in enumerate(escolhidos)]
+
+    def mover(linhas):
+        _, faltas = gravar_com_repeticao(banco, cache, lambda df, versao, base: transferir(df, linhas, cache.derivado(versao, base, "indice", IndiceProdutos)))
+        if faltas.empty: log.registrar(linhas_log(linhas))
+
+    def sugestao():
+        versao, frame = cache.obter()
+        m = MotorSugestao(); m.sincronizar(frame, versao)
+        return m.sugestao("Todos")[1]
+
+    romaneio = [{"Destino": destinos[i % len(destinos)], "Produto": p, "Quantidade": i % 7 + 1} for i, p in enumerate(produtos)]
+    pedido = sugestao().assign(**{"Qtd Compra": lambda d: d["Qtd Compra"].clip(lower=1)})
+    pedido = pedido.assign(**{"Total Item": pedido["Qtd Compra"] * pedido["Custo"]})
+
+    return [
+        ("carregar_dados", n, lambda: CacheCadastro(banco).obter(), None),
+        ("carregar_dados_incremental", 1, leitor.obter, preparar_incremental),
+        ("salvar_1_celula", 1, lambda: gravar_com_repeticao(banco, cache, editar_custo), None),
+        ("registrar_log_1", 1, lambda: log.registrar([nova_linha(produtos[0], 1, "Transferência", "Central -> " + destinos[0])]), None),
+        ("registrar_log_100", 100, lambda: log.registrar(linhas_log(carga())), None),
+        ("importar_cadastro", len(cadastro_planilha), lambda df, ind: importar_cadastro(df, cadastro_planilha, "Geral", ind), preparar_importacao),
+        ("importar_contagem", n, lambda df, ind: importar_contagem_em_blocos(df, PlanilhaContagem(caminho_contagem).blocos(),
+                                                                            "Código", "Produto", "Qtd", col_dest, ind), preparar_importacao),
+        ("transferencia", ITENS_TRANSFERENCIA, mover, lambda: (carga(),)),
+        ("compras_sugestao", n, sugestao, None),
+        ("criar_pdf_unificado", len(romaneio), lambda: criar_pdf_unificado(romaneio), None),
+        ("criar_pdf_pedido", len(pedido), lambda: criar_pdf_pedido(pedido, "FORNECEDOR 00", float(pedido["Total Item"].sum())), None),
+    ]
+
+
+def executar(tamanhos=TAMANHOS, repeticoes=REPETICOES, motor="sqlite", saida="benchmark.csv"):
+    metricas = Metricas(saida, versao_codigo())
+    for n in tamanhos:
+        pasta = tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            for nome, linhas, funcao, preparar in casos(n, motor, pasta):
+                tempos = _cronometrar(funcao, repeticoes, preparar)
+                for t in tempos: metricas.registrar("benchmark", f"{motor}.{nome}.{n}", t, linhas)
+                print(f"  {n:>7} {nome:<28} {np.median(tempos) * 1000:10.1f} ms", flush=True)
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+    return relatorio(metricas.ler())
+
+
+def relatorio(df):
+    """Resumo da versão mais recente do arquivo e, se houver, a comparação com a anterior."""
+    df = df[df["Tipo"] == "benchmark"]
+    versoes = list(dict.fromkeys(df["Versao"]))
+    if not versoes: return None
+    atual = versoes[-1]
+    r = resumo(df[df["Versao"] == atual])
+    print(f"\nVersão {atual}:")
+    print(r[["Nome", "Linhas", "N", "Mediana_ms", "P95_ms"]].to_string(index=False, float_format="%.1f"))
+    if len(versoes) > 1:
+        c = comparar(df, versoes[-2], atual)
+        print(f"\n{atual} contra {versoes[-2]} (Razao > 1: mais lento):")
+        print(c.to_string(index=False, float_format="%.2f"))
+        return c
+    return r
+
+
+if __name__ == "__main__":
+    a = sys.argv[1:]
+    executar(tuple(int(x) for x in a[0].split(",")) if len(a) > 0 else TAMANHOS, int(a[1]) if len(a) > 1 else REPETICOES,
+             a[2] if len(a) > 2 else "sqlite", a[3] if len(a) > 3 else "benchmark.csv")
@@ -0,0 +1,115 @@
+"""Busca de produtos por nome para as caixas Buscar/Filtrar das telas.
+
+Os nomes são normalizados uma vez por versão do cadastro (minúsculas, sem
+acento, espaços simples), então "agua" acha "ÁGUA". O índice guarda os
+trigramas de todos os nomes num array ordenado com a posição da linha de
+cada um; um termo de 3 ou mais letras é procurado intersectando as posições
+dos seus trigramas e conferindo a substring só nessas linhas. Termos de 1 ou
+2 letras ("ml", "kg") não têm trigrama e são procurados numa varredura
+vetorizada do texto de todos os nomes. Vários termos: a linha precisa ter
+todos.
+
+Os resultados vêm ordenados: nome igual à busca, nome que começa com ela,
+todos os termos no começo de palavras, o resto; no empate, o nome mais curto.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_TRIGRAMA = 3
+_ACENTOS = re.compile("[\u0300-\u036f]")
+_ESPACOS = re.compile(r"\s+")
+
+
+def normalizar(texto):
+    """Texto em minúsculas, sem acentos e com espaços simples."""
+    if texto is None or (not isinstance(texto, str) and pd.isna(texto)): return ""
+    t = _ACENTOS.sub("", unicodedata.normalize("NFKD", str(texto))).casefold()
+    return _ESPACOS.sub(" ", t).strip()
+
+
+def normalizar_serie(serie):
+    """Versão vetorizada de ``normalizar``."""
+    s = serie.astype("string").fillna("").str.normalize("NFKD").str.replace(_ACENTOS.pattern, "", regex=True)
+    return s.str.casefold().str.replace(_ESPACOS.pattern, " ", regex=True).str.strip().astype(str)
+
+
+def _codigos(texto):
+    return np.frombuffer(texto.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+
+
+def _trigramas(c):
+    """Código inteiro de cada trigrama do array de caracteres ``c`` (21 bits por caractere)."""
+    return (c[:-2] << 42) | (c[1:-1] << 21) | c[2:]
+
+
+class IndiceBusca:
+    def __init__(self, df, coluna="Produto"):
+        self.rotulos_linha = df.index.to_numpy()
+        self.nomes = normalizar_serie(df[coluna]).reset_index(drop=True) if coluna in df.columns else pd.Series("", index=range(len(df)))
+        # todos os nomes num array só, separados por \0; _linha diz de que linha é cada caractere
+        self._c = _codigos("\0" + "\0".join(self.nomes.tolist() + [""]))
+        self._tamanhos = self.nomes.str.len().to_numpy()
+        self._linha = np.concatenate([[-1], np.repeat(np.arange(len(self.nomes), dtype=np.int32), self._tamanhos + 1)])
+        tri = _trigramas(self._c)
+        ok = (self._c[:-2] != 0) & (self._c[1:-1] != 0) & (self._c[2:] != 0)
+        tri, linha = tri[ok], self._linha[:-2][ok]
+        ordem = np.lexsort((linha, tri))
+        tri, linha = tri[ordem], linha[ordem]
+        unico = np.ones(len(tri), dtype=bool)
+        unico[1:] = (tri[1:] != tri[:-1]) | (linha[1:] != linha[:-1])
+        self._tri, self._tri_linha = tri[unico], linha[unico]
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def _com_trigrama(self, t):
+        ini, fim = np.searchsorted(self._tri, t, side="left"), np.searchsorted(self._tri, t, side="right")
+        return self._tri_linha[ini:fim]
+
+    def _termo(self, termo):
+        """Posições (ordenadas) das linhas que contêm ``termo``."""
+        c = _codigos(termo)
+        if len(c) < TAMANHO_TRIGRAMA:
+            # termo curto: substring em qualquer lugar, numa varredura vetorizada do array de caracteres
+            # (o \0 entre os nomes nunca casa, então um termo não atravessa de um nome para o outro)
+            n = len(self._c) - len(c) + 1
+            ok = self._c[:n] == c[0]
+            for i, x in enumerate(c[1:], 1): ok &= self._c[i:n + i] == x
+            return np.unique(self._linha[:n][ok])
+        candidatas = None
+        for t in sorted(set(_trigramas(c).tolist()), key=lambda t: len(self._com_trigrama(t))):
+            linhas = self._com_trigrama(t)
+            candidatas = linhas if candidatas is None else np.intersect1d(candidatas, linhas, assume_unique=True)
+            if not len(candidatas): return candidatas
+        if len(c) == TAMANHO_TRIGRAMA: return candidatas
+        return candidatas[self.nomes.iloc[candidatas].str.contains(termo, regex=False).to_numpy()]
+
+    def posicoes(self, consulta):
+        """Posições das linhas que casam com ``consulta``, da mais relevante para a menos."""
+        consulta = normalizar(consulta)
+        if not consulta: return np.arange(len(self.nomes))
+        termos = list(dict.fromkeys(consulta.split(" ")))
+        pos = None
+        for termo in sorted(termos, key=len, reverse=True):
+            achadas = self._termo(termo)
+            pos = achadas if pos is None else np.intersect1d(pos, achadas, assume_unique=True)
+            if not len(pos): return pos
+        nomes = self.nomes.iloc[pos]
+        palavras = np.logical_and.reduce([nomes.str.contains(r"(?:^|[^a-z0-9])" + re.escape(t), regex=True).to_numpy() for t in termos])
+        nivel = np.select([(nomes == consulta).to_numpy(), nomes.str.startswith(consulta).to_numpy(), palavras], [0, 1, 2], 3)
+        return pos[np.lexsort((pos, self._tamanhos[pos], nivel))]
+
+    def rotulos(self, consulta):
+        """Rótulos do cadastro das linhas que casam, na ordem de ``posicoes``."""
+        return self.rotulos_linha[self.posicoes(consulta)]
+
+    def filtrar(self, df, consulta, coluna=None):
+        """Linhas de ``df`` (indexado pelo rótulo do cadastro, ou com ele em ``coluna``) que casam, na ordem da busca."""
+        if not normalizar(consulta): return df
+        chaves = df.index if coluna is None else pd.Index(df[coluna])
+        ordem = pd.Index(self.rotulos(consulta)).get_indexer(chaves)
+        achadas = np.flatnonzero(ordem >= 0)
+        return df.iloc[achadas[np.argsort(ordem[achadas], kind="stable")]]
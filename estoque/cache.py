@@ -0,0 +1,75 @@
+"""Cache do cadastro em memória, por versão do banco.
+
+Um ``CacheCadastro`` por processo guarda o frame da versão atual e o entrega
+a todas as sessões sem cópia. Quando a versão do banco muda, só as linhas
+gravadas depois da versão em memória são lidas (``alteracoes`` do backend) e
+aplicadas sobre uma cópia rasa: com o copy-on-write do pandas, os frames
+entregues antes não mudam, e cada versão publicada é imutável.
+
+Os caches derivados (índice, fatias por categoria...) ficam presos à versão
+do frame de onde vieram e somem junto com ela.
+"""
+import threading
+
+import pandas as pd
+
+from .esquema import alinhar_categorias, atribuir
+
+VERSOES_MANTIDAS = 4
+FRACAO_RECARGA = 0.5
+
+
+def aplicar_alteracoes(frame, linhas, excluidos):
+    """Novo frame = ``frame`` sem ``excluidos``, com ``linhas`` substituídas ou acrescentadas no fim."""
+    novo = frame.drop(index=frame.index.intersection(excluidos)) if len(excluidos) else frame.copy(deep=False)
+    if len(linhas) == 0: return novo
+    novo, linhas = alinhar_categorias(novo, linhas)
+    existentes = linhas.index.intersection(novo.index)
+    if len(existentes):
+        # atribuir: um saldo fracionado gravado promove a coluna inteira em vez de falhar
+        for c in linhas.columns:
+            atribuir(novo, existentes, c, linhas.loc[existentes, c].to_numpy())
+    novas = linhas.index.difference(novo.index)
+    if len(novas): novo = pd.concat([novo, linhas.loc[novas]])
+    return novo
+
+
+class CacheCadastro:
+    def __init__(self, banco, versoes_mantidas=VERSOES_MANTIDAS):
+        self.banco = banco
+        self.versoes_mantidas = versoes_mantidas
+        self.versao = None
+        self._frames = {}
+        self._derivados = {}
+        self._trava = threading.Lock()
+
+    def _atualizar(self):
+        atual = self._frames.get(self.versao)
+        if atual is None or not hasattr(self.banco, "alteracoes"):
+            return self.banco.carregar_versionado()
+        nova, linhas, excluidos = self.banco.alteracoes(self.versao)
+        # unidade nova muda as colunas da visão larga: relê tudo
+        if not linhas.columns.equals(atual.columns) or len(linhas) + len(excluidos) > FRACAO_RECARGA * max(len(atual), 1):
+            return self.banco.carregar_versionado()
+        return nova, aplicar_alteracoes(atual, linhas, excluidos)
+
+    def obter(self):
+        """(versão, frame) atuais. O frame é compartilhado: para alterar, use ``frame.copy(deep=False)``."""
+        versao = self.banco.versao()
+        with self._trava:
+            if versao != self.versao:
+                versao, frame = self._atualizar()
+                self._frames[versao] = frame; self.versao = versao
+                for v in sorted(self._frames)[:-self.versoes_mantidas]:
+                    del self._frames[v]
+                self._derivados = {k: d for k, d in self._derivados.items() if k[0] in self._frames}
+            return self.versao, self._frames[self.versao]
+
+    def derivado(self, versao, frame, chave, funcao):
+        """``funcao(frame)`` da versão ``versao``, calculado uma vez enquanto a versão estiver em memória."""
+        with self._trava:
+            k = (versao, chave)
+            if k in self._derivados: return self._derivados[k]
+            valor = funcao(frame)
+            if versao in self._frames: self._derivados[k] = valor
+            return valor
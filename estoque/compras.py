@@ -0,0 +1,93 @@
+"""Sugestão de compra (Meta - Estoque Total) com cache compartilhado.
+
+``MotorSugestao`` guarda o cálculo do cadastro inteiro e as fatias por
+fornecedor para a versão mais recente do banco que alguém sincronizou. Ele é
+único por processo (as sessões do Streamlit compartilham a mesma instância):
+uma sessão atrasada não volta o cálculo para uma versão antiga, e quando a
+versão avança só as linhas cujas entradas mudaram são recalculadas.
+
+A meta é a soma dos mínimos (``Min_*``) e o estoque total a soma de todos os
+``Estoque_*`` do cadastro, qualquer que seja o número de unidades.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .esquema import alinhar_categorias
+from .metricas import medido
+from .unidades import colunas_estoque, colunas_minimo
+
+COLUNAS_ENTRADA = ["Produto", "Fornecedor", "Padrao", "Custo"]
+COLUNAS_SUGESTAO = ["Produto", "Fornecedor", "Padrao", "Estoque Total", "Meta Global", "Custo", "Qtd Compra", "Valor Total"]
+
+
+def calcular_sugestao(df):
+    """Meta Global, Estoque Total, Qtd Compra e Valor Total para todas as linhas de uma vez."""
+    def num(c): return pd.to_numeric(df[c], errors="coerce").fillna(0) if c in df.columns else pd.Series(0.0, index=df.index)
+    out = pd.DataFrame({c: df[c] if c in df.columns else pd.NA for c in ("Produto", "Fornecedor", "Padrao")}, index=df.index)
+    out["Meta Global"] = sum((num(c) for c in colunas_minimo(df.columns)), pd.Series(0.0, index=df.index))
+    out["Estoque Total"] = sum((num(c) for c in colunas_estoque(df.columns)), pd.Series(0.0, index=df.index))
+    out["Custo"] = num("Custo")
+    out["Qtd Compra"] = np.trunc((out["Meta Global"] - out["Estoque Total"]).clip(lower=0)).astype("int64")
+    out["Valor Total"] = out["Qtd Compra"] * out["Custo"]
+    return out[COLUNAS_SUGESTAO]
+
+
+def totais_pedido(editado):
+    """(itens, valor) da tabela de compra editada na tela."""
+    return int(editado["Qtd Compra"].sum()), float((editado["Qtd Compra"] * editado["Custo"]).sum())
+
+
+def itens_pedido(editado):
+    """Linhas com quantidade a comprar, com o ``Total Item`` que vai para o pedido."""
+    itens = editado[editado["Qtd Compra"] > 0]
+    return itens.assign(**{"Total Item": itens["Qtd Compra"] * itens["Custo"]})
+
+
+class MotorSugestao:
+    def __init__(self):
+        self.versao = None
+        self._entrada = None
+        self._calculo = None
+        self._fatias = {}
+        self._trava = threading.Lock()
+
+    def _linhas_alteradas(self, entrada):
+        ant = self._entrada
+        if entrada.index.equals(ant.index): comuns, a, b = entrada.index, entrada, ant
+        else:
+            comuns = entrada.index.intersection(ant.index)
+            a, b = entrada.loc[comuns], ant.loc[comuns]
+        # fornecedor novo muda as categorias; comparar categóricas exige as mesmas
+        a, b = alinhar_categorias(a, b)
+        mudou = ((a != b) & ~(a.isna() & b.isna())).any(axis=1).to_numpy()
+        return comuns[~mudou], comuns[mudou].append(entrada.index.difference(ant.index))
+
+    @medido()
+    def sincronizar(self, df, versao):
+        """Atualiza o cálculo para ``versao``; as fatias da versão anterior são descartadas.
+
+        Uma versão igual ou mais antiga que a do cálculo atual é ignorada.
+        """
+        with self._trava:
+            if self.versao is not None and versao <= self.versao: return
+            entrada = df.reindex(columns=COLUNAS_ENTRADA + colunas_minimo(df.columns) + colunas_estoque(df.columns))
+            if self._calculo is None or not entrada.columns.equals(self._entrada.columns):
+                calculo = calcular_sugestao(entrada)
+            else:
+                mantidas, recalcular = self._linhas_alteradas(entrada)
+                calculo = pd.concat([self._calculo.loc[mantidas], calcular_sugestao(entrada.loc[recalcular])]).reindex(entrada.index)
+            self._entrada, self._calculo, self._fatias, self.versao = entrada, calculo, {}, versao
+
+    def sugestao(self, fornecedor="Todos"):
+        """(versão, fatia do fornecedor ou do cadastro todo), lidas juntas.
+
+        A versão pode ser mais nova que a sincronizada por quem chama, se outra sessão
+        avançou o cálculo no meio. O frame é compartilhado: não altere no lugar.
+        """
+        with self._trava:
+            if fornecedor not in self._fatias:
+                calc = self._calculo
+                self._fatias[fornecedor] = calc if fornecedor == "Todos" else calc[calc["Fornecedor"] == fornecedor]
+            return self.versao, self._fatias[fornecedor]
@@ -0,0 +1,107 @@
+"""Controle de concorrência entre sessões e processos que gravam o cadastro.
+
+``salvar(df, base)`` é um compare-and-swap por célula: cada valor alterado só
+é gravado se o banco ainda tiver o valor que a sessão leu (o de ``base``).
+Se outra sessão mexeu na mesma célula no meio do caminho, nada é gravado e
+sai ``ConflitoGravacao`` com as células em disputa. ``gravar_com_repeticao``
+relê o cadastro e refaz a operação nesses casos, então uma transferência
+calculada sobre um saldo velho é recalculada sobre o saldo novo em vez de
+apagar o movimento da outra sessão.
+
+``TravaArquivo`` serializa quem grava arquivos inteiros (o CSV do cadastro e
+o log) entre processos; no SQLite a transação ``BEGIN IMMEDIATE`` já faz isso.
+"""
+import os
+import random
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try: import fcntl
+except ImportError: fcntl = None; import msvcrt
+
+TENTATIVAS = 5
+ESPERA = 0.05
+TIMEOUT_TRAVA = 30
+COLUNAS_CONFLITO = ["Produto", "Coluna", "Lido", "Atual", "Novo"]
+
+
+class ConflitoGravacao(Exception):
+    """Células alteradas por outra sessão desde a leitura. ``conflitos``: DataFrame com ``COLUNAS_CONFLITO`` por rótulo."""
+
+    def __init__(self, conflitos):
+        self.conflitos = conflitos
+        super().__init__(f"{len(conflitos)} valor(es) alterado(s) por outra sessão desde a leitura")
+
+
+def iguais(a, b):
+    if pd.isna(a) and pd.isna(b): return True
+    if pd.isna(a) or pd.isna(b): return False
+    try: return float(a) == float(b)
+    except (TypeError, ValueError): return str(a) == str(b)
+
+
+def conflitos(celulas, atual):
+    """``celulas``: (rótulo, coluna, lido, novo). Conflito = célula cujo valor atual não é mais o lido.
+
+    Mesmo que o valor atual seja igual ao novo é conflito: duas saídas de 2 sobre um saldo de 10
+    chegam ambas a 8, e aceitar a segunda perderia um movimento.
+    """
+    linhas = []
+    for rot, col, lido, novo in celulas:
+        existe = rot in atual.index and col in atual.columns
+        v = atual.at[rot, col] if existe else None
+        if existe and iguais(v, lido): continue
+        produto = atual.at[rot, "Produto"] if existe and "Produto" in atual.columns else None
+        linhas.append((rot, produto, col, lido, v if existe else "(excluído)", novo))
+    return pd.DataFrame([l[1:] for l in linhas], index=[l[0] for l in linhas], columns=COLUNAS_CONFLITO)
+
+
+# =================================================================================
+# TRAVA ENTRE PROCESSOS
+# =================================================================================
+@contextmanager
+def TravaArquivo(caminho, timeout=TIMEOUT_TRAVA):
+    """Trava exclusiva em ``caminho`` (arquivo ``.lock`` ao lado do protegido)."""
+    fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+    limite = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if fcntl: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else: msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() > limite: raise TimeoutError(f"Trava ocupada: {caminho}")
+                time.sleep(0.01)
+        try: yield
+        finally:
+            if fcntl: fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET); msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+# =================================================================================
+# LER - ALTERAR - GRAVAR
+# =================================================================================
+def gravar_com_repeticao(banco, cache, operacao, tentativas=TENTATIVAS):
+    """Aplica ``operacao(df, versao, base)`` sobre o cadastro mais recente e grava.
+
+    ``df`` é uma cópia rasa de ``base`` (versão ``versao``); a operação devolve
+    (frame a gravar, resultado). Em ``ConflitoGravacao`` o cadastro é relido e a
+    operação refeita, com espera crescente; depois de ``tentativas`` o conflito
+    sobe. Exceções da própria operação (ex.: saldo insuficiente) sobem na hora,
+    sem gravar nada. Devolve (frame gravado, resultado).
+    """
+    for tentativa in range(tentativas):
+        versao, base = cache.obter()
+        df, resultado = operacao(base.copy(deep=False), versao, base)
+        try:
+            banco.salvar(df, base=base)
+            return df, resultado
+        except ConflitoGravacao:
+            if tentativa == tentativas - 1: raise
+            time.sleep(ESPERA * (tentativa + 1) * (1 + random.random()))
@@ -0,0 +1,183 @@
+"""Geração dos PDFs de romaneio e pedido de compra.
+
+``TabelaPDF`` monta o cabeçalho (título + linha de títulos das colunas) uma
+vez e o repete em cada página; as linhas da tabela chegam como colunas de
+texto já formatadas (latin-1, escapadas, larguras calculadas por valor
+distinto) e cada linha vira um único trecho do content stream, em vez de três
+chamadas de ``cell`` com conversões célula a célula.
+"""
+import io
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+
+from .metricas import medido
+from .unidades import REGISTRO_PADRAO
+
+
+def latin1(serie, limite=None):
+    """Texto da coluna no que as fontes padrão do PDF aceitam (caracteres fora do latin-1 viram '?')."""
+    s = pd.Series(serie).astype(str).str.encode("latin-1", "replace").str.decode("latin-1")
+    return s.str.slice(0, limite) if limite else s
+
+
+def _escapar(serie):
+    return serie.str.replace("\\", "\\\\", regex=False).str.replace(")", "\\)", regex=False).str.replace("(", "\\(", regex=False).str.replace("\r", "\\r", regex=False)
+
+
+def _texto_pdf(texto):
+    return texto.encode("latin-1", "replace").decode("latin-1")
+
+
+class TabelaPDF(FPDF):
+    def __init__(self, titulo, subtitulo, colunas, altura_linha=8, altura_cabecalho=10, fonte=10, cor_cabecalho=(200, 220, 255)):
+        """``colunas``: lista de (título, largura, alinhamento 'L'/'C'/'R')."""
+        super().__init__()
+        self.titulo, self.subtitulo = _texto_pdf(titulo), _texto_pdf(subtitulo)
+        self.colunas = colunas
+        self.altura_linha, self.altura_cabecalho = altura_linha, altura_cabecalho
+        self.fonte = fonte
+        self.cor_cabecalho = cor_cabecalho
+        self.alias_nb_pages()
+        self.set_auto_page_break(True, margin=15)
+        self.set_font("Arial", size=fonte)
+        self.add_page()
+
+    # --- MODELOS DE CABEÇALHO E RODAPÉ ---
+    def header(self):
+        if self.page_no() == 1:
+            self.set_font("Arial", 'B', 16)
+            self.cell(190, 10, txt=self.titulo, ln=True, align='C')
+            self.set_font("Arial", size=10)
+            self.cell(190, 10, txt=self.subtitulo, ln=True, align='C')
+            self.ln(10)
+        self.set_fill_color(*self.cor_cabecalho); self.set_font("Arial", 'B', self.fonte)
+        for i, (nome, largura, _) in enumerate(self.colunas):
+            self.cell(largura, self.altura_cabecalho, _texto_pdf(nome), 1, int(i == len(self.colunas) - 1), 'C', fill=True)
+
+    def footer(self):
+        self.set_y(-12); self.set_font("Arial", size=8)
+        self.cell(0, 6, f"Pagina {self.page_no()}/{{nb}}", 0, 0, 'R')
+
+    # --- LINHAS ---
+    def linhas(self, textos):
+        """Desenha a tabela. ``textos``: uma sequência de strings por coluna, já formatadas."""
+        self.set_font("Arial", size=self.fonte)
+        n = len(textos[0]) if len(textos) else 0
+        if n == 0: return
+        k, h, cm = self.k, self.altura_linha, self.c_margin
+        cw, fs = self.current_font['cw'], self.font_size
+        cols = []
+        x = self.l_margin
+        for (nome, largura, alinhamento), valores in zip(self.colunas, textos):
+            valores = latin1(valores)
+            if alinhamento in ('R', 'C'):
+                # largura calculada uma vez por valor distinto (quantidades e preços se repetem muito)
+                largura_txt = {v: sum(cw.get(c, 0) for c in v) * fs / 1000.0 for v in valores.unique()}
+                livre = largura - valores.map(largura_txt)
+                dx = livre - cm if alinhamento == 'R' else livre / 2.0
+                xs_txt = np.char.mod('BT %.2f ', ((x + dx) * k).to_numpy())
+            else:
+                xs_txt = np.full(len(valores), 'BT %.2f ' % ((x + cm) * k), dtype=object)
+            cols.append((x, largura, xs_txt, _escapar(valores).to_numpy(), valores.to_numpy() != ""))
+            x += largura
+
+        # retângulos e a base do texto só dependem da altura da linha na página: um modelo por posição
+        modelos = {}
+        pagina = []
+        for i in range(n):
+            if self.y + h > self.page_break_trigger:
+                self._out('\n'.join(pagina)); pagina = []
+                self.add_page(self.cur_orientation)
+            y = self.y
+            if y not in modelos:
+                topo = (self.h - y) * k
+                modelos[y] = ('\n'.join('%.2f %.2f %.2f %.2f re S' % (cx * k, topo, cl * k, -h * k) for cx, cl, _, _, _ in cols),
+                              '%.2f Td (' % ((self.h - (y + .5 * h + .3 * fs)) * k))
+            retangulos, base = modelos[y]
+            pagina.append(retangulos)
+            for _, _, xs_txt, escapados, tem_texto in cols:
+                if tem_texto[i]: pagina.append(xs_txt[i] + base + escapados[i] + ') Tj ET')
+            self.y = y + h
+        if pagina: self._out('\n'.join(pagina))
+        self.x = self.l_margin
+
+    def bytes(self):
+        saida = self.output(dest='S')
+        return saida.encode('latin-1', 'replace') if isinstance(saida, str) else bytes(saida)
+
+
+# =================================================================================
+# ROMANEIO
+# =================================================================================
+def pivotar_carga(lista_carga):
+    df = pd.DataFrame(lista_carga)
+    return df.pivot_table(index='Produto', columns='Destino', values='Quantidade', aggfunc='sum', fill_value=0).reset_index()
+
+
+@medido()
+def criar_pdf_unificado(lista_carga, pivot=None, unidades=REGISTRO_PADRAO):
+    """Romaneio da carga: uma coluna de quantidade e uma assinatura por hospital do registro.
+
+    Se a tela já pivotou a carga, passe ``pivot`` para não refazer.
+    """
+    df_pivot = pivotar_carga(lista_carga) if pivot is None else pivot
+    destinos = unidades.destinos
+    largura = min(40, 120 / max(len(destinos), 1)); largura_produto = 190 - largura * len(destinos)
+    pdf = TabelaPDF("ROMANEIO DE ENTREGA UNIFICADO", f"Data Emissao: {datetime.now().strftime('%d/%m/%Y')}",
+                    [("Produto", largura_produto, 'L')] + [(f"Qtd {u.rotulo}", largura, 'C') for u in destinos])
+    textos = [latin1(df_pivot['Produto'], int(largura_produto / 2))]
+    for u in destinos:
+        q = pd.to_numeric(df_pivot[u.nome], errors="coerce").fillna(0) if u.nome in df_pivot.columns else pd.Series(0, index=df_pivot.index)
+        textos.append(np.where(q > 0, q.astype("int64").astype(str), "-"))
+    pdf.linhas(textos)
+
+    # assinaturas, três por linha
+    assinaturas = [f"Expedicao ({unidades.central.rotulo})"] + [f"Recebedor ({u.rotulo})" for u in destinos]
+    for inicio in range(0, len(assinaturas), 3):
+        grupo = assinaturas[inicio:inicio + 3]
+        pdf.ln(20 if inicio == 0 else 10); pdf.set_font("Arial", size=10)
+        for i in range(len(grupo)):
+            if i: pdf.cell(5, 10, "", 0, 0)
+            pdf.cell(60, 10, "_"*30, 0, int(i == len(grupo) - 1), 'C')
+        pdf.set_font("Arial", size=8)
+        for i, assinatura in enumerate(grupo):
+            if i: pdf.cell(5, 5, "", 0, 0)
+            pdf.cell(60, 5, _texto_pdf(assinatura), 0, int(i == len(grupo) - 1), 'C')
+    return pdf.bytes()
+
+
+# =================================================================================
+# PEDIDO DE COMPRA
+# =================================================================================
+@medido()
+def criar_pdf_pedido(dataframe, fornecedor, total):
+    pdf = TabelaPDF(f"PEDIDO DE COMPRA - {fornecedor.upper()}", f"Data: {datetime.now().strftime('%d/%m/%Y')}",
+                    [("Produto", 90, 'L'), ("Padrao", 30, 'C'), ("Qtd", 20, 'C'), ("Custo", 25, 'R'), ("Total", 25, 'R')],
+                    altura_cabecalho=8, fonte=9, cor_cabecalho=(230, 230, 230))
+    padrao = dataframe['Padrao'] if 'Padrao' in dataframe.columns else pd.Series('-', index=dataframe.index)
+    custo = pd.to_numeric(dataframe['Custo'], errors="coerce").fillna(0).to_numpy(float)
+    total_item = pd.to_numeric(dataframe['Total Item'], errors="coerce").fillna(0).to_numpy(float)
+    pdf.linhas([
+        latin1(dataframe['Produto'].astype(str).str.slice(0, 45)),
+        latin1(padrao),
+        pd.to_numeric(dataframe['Qtd Compra'], errors="coerce").fillna(0).astype("int64").astype(str),
+        np.char.add("R$ ", np.char.mod("%.2f", custo)),
+        np.char.add("R$ ", np.char.mod("%.2f", total_item)),
+    ])
+    pdf.ln(5); pdf.set_font("Arial", 'B', 12)
+    pdf.cell(190, 10, txt=f"TOTAL GERAL: R$ {total:,.2f}", ln=True, align='R')
+    return pdf.bytes()
+
+
+# =================================================================================
+# PLANILHA
+# =================================================================================
+@medido()
+def criar_xlsx(dataframe, aba):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as writer:
+        dataframe.to_excel(writer, index=False, sheet_name=aba)
+    return buf.getvalue()
@@ -0,0 +1,98 @@
+"""Tipos do cadastro em memória.
+
+Os backends entregam o cadastro com tipos fixos em vez do que o
+``read_csv``/``read_sql`` adivinhar: os textos que se repetem (Categoria,
+Fornecedor, Padrao) como ``category``, saldos e mínimos como ``int32`` (ou
+``float64``, se a coluna tiver quantidade fracionada, ex.: itens em Kg) e o
+custo como ``float32``. Com o copy-on-write do pandas as telas filtram e
+montam tabelas direto sobre o frame compartilhado, sem ``.copy()``: só a
+coluna que alguém altera é copiada.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_float_dtype, is_integer_dtype, is_numeric_dtype
+
+from .unidades import colunas_estoque, colunas_minimo
+
+TEXTOS = ["Codigo", "Codigo_Unico", "Produto", "Produto_Alt"]
+CATEGORICAS = ["Categoria", "Fornecedor", "Padrao"]
+TIPO_SALDO = "int32"
+TIPO_CUSTO = "float32"
+
+
+def tipos(colunas):
+    """{coluna: tipo} das colunas do cadastro presentes em ``colunas``."""
+    t = {c: "str" for c in TEXTOS if c in colunas}
+    t.update({c: "category" for c in CATEGORICAS if c in colunas})
+    if "Custo" in colunas: t["Custo"] = TIPO_CUSTO
+    t.update(dict.fromkeys(colunas_minimo(colunas) + colunas_estoque(colunas), TIPO_SALDO))
+    return t
+
+
+def _saldo(serie):
+    """Quantidades como ``int32`` se forem todas inteiras; senão ``float64``, sem arredondar."""
+    valores = pd.to_numeric(serie, errors="coerce").fillna(0).to_numpy("float64")
+    inteiros = np.array_equal(valores, np.rint(valores)) and (not len(valores) or np.abs(valores).max() < 2 ** 31)
+    return pd.Series(valores.astype(TIPO_SALDO) if inteiros else valores, index=serie.index, name=serie.name)
+
+
+def _converter(serie, tipo):
+    if tipo == TIPO_SALDO: return _saldo(serie)
+    if tipo == TIPO_CUSTO: return pd.to_numeric(serie, errors="coerce").astype(tipo)
+    if tipo == "category": return serie.astype("str").astype("category")
+    return serie.astype(tipo)
+
+
+def aplicar_esquema(df):
+    """``df`` com os tipos do cadastro; colunas já no tipo certo não são tocadas.
+
+    Saldo vazio vira 0; uma coluna de saldo com algum valor fracionado fica ``float64``.
+    """
+    novas = {c: _converter(df[c], t) for c, t in tipos(df.columns).items() if df[c].dtype != t}
+    return df.assign(**novas) if novas else df
+
+
+def alinhar_categorias(a, b):
+    """(a, b) com as mesmas categorias nas colunas categóricas, para atribuir ou concatenar sem virar object."""
+    novas_a, novas_b = {}, {}
+    for c in a.columns.intersection(b.columns):
+        if isinstance(a[c].dtype, pd.CategoricalDtype) and isinstance(b[c].dtype, pd.CategoricalDtype):
+            ca, cb = a[c].cat.categories, b[c].cat.categories
+            if ca.equals(cb): continue
+            todas = ca.append(cb.difference(ca))
+            novas_a[c], novas_b[c] = a[c].cat.set_categories(todas), b[c].cat.set_categories(todas)
+    return (a.assign(**novas_a), b.assign(**novas_b)) if novas_a else (a, b)
+
+
+def atribuir(df, rotulos, coluna, valores):
+    """``df.loc[rotulos, coluna] = valores`` sem trocar o tipo da coluna quando os valores cabem nele.
+
+    Inteiros exatos entram em ``int32``, números em ``float32`` e textos novos viram categorias;
+    o que não cabe (ex.: 2.5 num saldo) promove a coluna. Altera ``df`` no lugar.
+    """
+    if coluna not in df.columns: df[coluna] = pd.NA
+    tipo = df[coluna].dtype
+    valores = np.asarray(valores)
+    if is_numeric_dtype(valores.dtype) and valores.dtype != bool:
+        if is_integer_dtype(tipo) and np.array_equal(valores, np.rint(valores)): valores = valores.astype(tipo)
+        elif is_float_dtype(tipo): valores = valores.astype(tipo)
+    elif isinstance(tipo, pd.CategoricalDtype):
+        novas = pd.Index(pd.unique(valores[pd.notna(valores)])).difference(tipo.categories)
+        if len(novas): df[coluna] = df[coluna].cat.add_categories(novas)
+    try:
+        df.loc[rotulos, coluna] = valores
+    except (TypeError, ValueError):
+        # não cabe no tipo da coluna (ex.: 2.5 num saldo inteiro)
+        df[coluna] = df[coluna].astype(float if is_numeric_dtype(valores.dtype) and is_numeric_dtype(tipo) else object)
+        df.loc[rotulos, coluna] = valores
+
+
+def relatorio_memoria(df):
+    """Bytes por coluna com o esquema e como ficariam sem ele (textos object, números float64)."""
+    sem = df.astype({c: object if not is_numeric_dtype(t) or isinstance(t, pd.CategoricalDtype) else "float64"
+                     for c, t in df.dtypes.items()})
+    rel = pd.DataFrame({"Tipo": df.dtypes.astype(str), "Bytes": df.memory_usage(deep=True, index=False),
+                        "Bytes_Sem_Esquema": sem.memory_usage(deep=True, index=False)})
+    rel.loc["(índice)"] = ["", df.index.memory_usage(), df.index.memory_usage()]
+    rel.loc["Total"] = ["", rel["Bytes"].sum(), rel["Bytes_Sem_Esquema"].sum()]
+    return rel
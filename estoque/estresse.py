@@ -0,0 +1,133 @@
+"""Teste de carga: várias sessões simuladas movimentando o mesmo cadastro.
+
+Cada processo repete transferências Central -> hospital (e alguns estornos e
+mudanças de custo nas mesmas linhas) com ``gravar_com_repeticao``, como a tela
+de Transferência, e registra o log de cada movimento. No fim confere:
+
+- o estoque total de cada produto (soma das unidades) não mudou;
+- o saldo de cada hospital variou exatamente o que o log diz que foi enviado;
+- o log tem uma linha por item movimentado.
+
+Uso: ``python -m estoque.estresse [processos] [operacoes_por_processo] [produtos] [sqlite|csv]``
+"""
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .armazenamento import abrir_banco
+from .cache import CacheCadastro
+from .concorrencia import ConflitoGravacao, gravar_com_repeticao
+from .indice import IndiceProdutos
+from .log import LogEventos
+from .transferencia import aplicar_carga, linhas_log, validar_carga
+from .unidades import REGISTRO_PADRAO
+
+SALDO_INICIAL = 1000
+
+
+def cadastro_sintetico(n):
+    dados = {"Codigo": [f"{i:06d}" for i in range(n)], "Produto": [f"PRODUTO {i:06d}" for i in range(n)],
+             "Categoria": "Geral", "Fornecedor": "F", "Padrao": "Un", "Custo": 1.0}
+    for u in REGISTRO_PADRAO:
+        dados[u.coluna_estoque] = float(SALDO_INICIAL) if u.central else 0.0
+    for u in REGISTRO_PADRAO.destinos: dados[u.coluna_minimo] = 10.0
+    return pd.DataFrame(dados)
+
+
+def sessao(args):
+    """Um processo: ``operacoes`` movimentos aleatórios. Devolve (movimentos, tentativas, desistências, faltas)."""
+    motor, caminho, caminho_log, operacoes, produtos, semente = args
+    rnd = random.Random(semente)
+    banco = abrir_banco(motor, caminho); cache = CacheCadastro(banco); log = LogEventos(caminho_log)
+    destinos = [u.nome for u in REGISTRO_PADRAO.destinos]
+    movimentos = tentativas = desistencias = faltas = 0
+    for _ in range(operacoes):
+        # poucos produtos "quentes" para forçar disputa pelas mesmas células
+        nomes = [f"PRODUTO {rnd.randrange(min(produtos, 20)):06d}" for _ in range(rnd.randint(1, 3))]
+        linhas = [{"Destino": rnd.choice(destinos), "Produto": p, "Quantidade": rnd.randint(1, 5)} for p in dict.fromkeys(nomes)]
+        estorno = rnd.random() < 0.2
+        custo = rnd.random() < 0.1
+
+        def operacao(df, versao, base):
+            nonlocal tentativas
+            tentativas += 1
+            indice = cache.derivado(versao, base, "indice", IndiceProdutos)
+            if custo:
+                rot = indice.por_nome(linhas[0]["Produto"])
+                df.loc[rot, "Custo"] = round(rnd.uniform(1, 10), 2)
+                return df, None
+            if estorno:
+                # só estorna o que o hospital tem
+                cols = {d: REGISTRO_PADRAO.resolver(d).coluna_estoque for d in destinos}
+                validas = [l for l in linhas if df.at[indice.por_nome(l["Produto"]), cols[l["Destino"]]] >= l["Quantidade"]]
+                aplicar_carga(df, validas, indice, sinal=-1)
+                return df, validas
+            if not validar_carga(df, linhas, indice).empty: return df, []
+            aplicar_carga(df, linhas, indice)
+            return df, linhas
+
+        try: _, feitas = gravar_com_repeticao(banco, cache, operacao)
+        except ConflitoGravacao:
+            desistencias += 1; continue
+        if custo: continue
+        if not feitas: faltas += 1; continue
+        log.registrar(linhas_log(feitas, estorno=estorno))
+        movimentos += len(feitas)
+    return movimentos, tentativas, desistencias, faltas
+
+
+def conferir(banco, caminho_log, inicial):
+    final = banco.carregar().set_index("Produto")
+    inicial = inicial.set_index("Produto")
+    erros = []
+    cols = REGISTRO_PADRAO.colunas_estoque()
+    total = final[cols].sum(axis=1) - inicial[cols].sum(axis=1)
+    if (total.abs() > 1e-9).any(): erros.append(f"estoque total mudou em {int((total.abs() > 1e-9).sum())} produtos")
+
+    log = LogEventos(caminho_log).ler()
+    log["Quantidade"] = pd.to_numeric(log["Quantidade"])
+    sinal = np.where(log["Tipo"] == "Estorno", -1, 1)
+    destino = np.where(sinal > 0, log["Detalhe"].str.split(" -> ").str[1], log["Detalhe"].str.split(" -> ").str[0])
+    enviado = pd.Series(sinal * log["Quantidade"].to_numpy()).groupby([log["Produto"].to_numpy(), destino]).sum()
+    for u in REGISTRO_PADRAO.destinos:
+        esperado = enviado.xs(u.nome, level=1).reindex(final.index).fillna(0) if u.nome in enviado.index.get_level_values(1) else 0
+        dif = final[u.coluna_estoque] - inicial[u.coluna_estoque] - esperado
+        if (dif.abs() > 1e-9).any(): erros.append(f"{u.nome}: saldo diverge do log em {int((dif.abs() > 1e-9).sum())} produtos")
+    return erros, len(log)
+
+
+def executar(processos=8, operacoes=200, produtos=1000, motor="sqlite", pasta=None):
+    pasta = pasta or tempfile.mkdtemp(prefix="estresse_")
+    caminho = os.path.join(pasta, "banco_dados.db" if motor == "sqlite" else "banco_dados.csv")
+    caminho_log = os.path.join(pasta, "historico_log.csv")
+    inicial = cadastro_sintetico(produtos)
+    banco = abrir_banco(motor, caminho)
+    if motor == "sqlite": banco.substituir(inicial)
+    else: banco.salvar(inicial)
+
+    inicio = time.perf_counter()
+    with mp.get_context("spawn").Pool(processos) as pool:
+        res = pool.map(sessao, [(motor, caminho, caminho_log, operacoes, produtos, s) for s in range(processos)])
+    duracao = time.perf_counter() - inicio
+
+    movimentos, tentativas, desistencias, faltas = (sum(r[i] for r in res) for i in range(4))
+    erros, linhas_log_ = conferir(banco, caminho_log, inicial)
+    if linhas_log_ != movimentos: erros.append(f"log tem {linhas_log_} linhas para {movimentos} movimentos")
+    print(f"{motor}: {processos} processos x {operacoes} operações em {duracao:.1f}s ({processos * operacoes / duracao:.0f} op/s)")
+    print(f"  itens movimentados: {movimentos} | tentativas: {tentativas} (repetições: {tentativas - processos * operacoes + desistencias})"
+          f" | desistências por conflito: {desistencias} | sem saldo: {faltas}")
+    print("  OK: saldos e log consistentes" if not erros else "  FALHOU: " + "; ".join(erros))
+    return not erros
+
+
+if __name__ == "__main__":
+    a = sys.argv[1:]
+    ok = executar(int(a[0]) if len(a) > 0 else 8, int(a[1]) if len(a) > 1 else 200,
+                  int(a[2]) if len(a) > 2 else 1000, a[3] if len(a) > 3 else "sqlite")
+    sys.exit(0 if ok else 1)
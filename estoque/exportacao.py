@@ -0,0 +1,150 @@
+"""Fila de exportação (PDF/XLSX) em segundo plano, com cache em disco.
+
+Cada exportação é identificada pelo hash do conteúdo (tipo do documento,
+itens, data de emissão). O mesmo pedido nunca é gerado duas vezes: se já está
+no cache o trabalho nasce pronto, e se está sendo gerado o clique repetido
+recebe o mesmo trabalho. O PDF e o XLSX são gerados em paralelo no pool.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+DIRETORIO_CACHE = ".cache_exportacao"
+LIMITE_CACHE = 200 * 1024 * 1024
+MAX_TRABALHOS = 256
+
+
+def chave_documento(tipo, *partes):
+    """Hash do conteúdo de um documento.
+
+    ``partes`` precisa cobrir tudo o que o documento mostra (ex.: o registro de unidades, que dá as
+    colunas do romaneio). A data entra na chave porque os PDFs trazem a data de emissão.
+    """
+    h = hashlib.sha256(f"{tipo}|{date.today().isoformat()}".encode())
+    for p in partes:
+        if isinstance(p, pd.DataFrame):
+            h.update("|".join(map(str, p.columns)).encode())
+            h.update(pd.util.hash_pandas_object(p, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(p).encode())
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+# =================================================================================
+# CACHE EM DISCO
+# =================================================================================
+class CacheArtefatos:
+    def __init__(self, diretorio=DIRETORIO_CACHE, limite_bytes=LIMITE_CACHE):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self._trava = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho(self, chave, ext):
+        return os.path.join(self.diretorio, f"{chave}.{ext}")
+
+    def obter(self, chave, ext):
+        """Caminho do artefato, ou None. Marca o uso para a política LRU."""
+        p = self.caminho(chave, ext)
+        try: os.utime(p)
+        except OSError: return None
+        return p
+
+    def gravar(self, chave, ext, dados):
+        p = self.caminho(chave, ext)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(dados)
+        os.replace(tmp, p)
+        self._limitar()
+        return p
+
+    def _limitar(self):
+        with self._trava:
+            arquivos = []
+            for e in os.scandir(self.diretorio):
+                if e.is_file() and not e.name.endswith(".tmp"):
+                    st = e.stat(); arquivos.append((st.st_mtime, st.st_size, e.path))
+            total = sum(a[1] for a in arquivos)
+            for _, tamanho, p in sorted(arquivos):
+                if total <= self.limite_bytes: break
+                try: os.remove(p); total -= tamanho
+                except OSError: pass
+
+
+# =================================================================================
+# TRABALHOS
+# =================================================================================
+class TrabalhoExportacao:
+    def __init__(self, chave):
+        self.chave = chave
+        self.futuros = {}
+
+    @property
+    def concluido(self):
+        return all(f.done() for f in self.futuros.values())
+
+    @property
+    def progresso(self):
+        return sum(f.done() for f in self.futuros.values()) / max(len(self.futuros), 1)
+
+    @property
+    def falhou(self):
+        return any(f.done() and f.exception() is not None for f in self.futuros.values())
+
+    def estado(self):
+        def um(f):
+            if not f.done(): return "gerando"
+            return "erro" if f.exception() is not None else "pronto"
+        return {nome: um(f) for nome, f in self.futuros.items()}
+
+    @property
+    def disponivel(self):
+        """Todos os arquivos ainda estão no cache (o limite de tamanho pode ter removido algum)."""
+        return all(f.done() and f.exception() is None and os.path.exists(f.result()) for f in self.futuros.values())
+
+    def arquivo(self, nome):
+        f = self.futuros.get(nome)
+        if f is None or not f.done() or f.exception() is not None: return None
+        return f.result()
+
+
+class FilaExportacao:
+    def __init__(self, cache=None, max_workers=4):
+        self.cache = cache or CacheArtefatos()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exportacao")
+        self._trabalhos = {}
+        self._trava = threading.Lock()
+
+    def _gerar(self, chave, ext, funcao, args):
+        return self.cache.gravar(chave, ext, funcao(*args))
+
+    def submeter(self, chave, tarefas):
+        """``tarefas``: {nome: (extensão, função que devolve bytes, args)}.
+
+        Devolve (trabalho, novo); ``novo`` é False quando tudo veio do cache ou de um
+        trabalho igual já em andamento.
+        """
+        with self._trava:
+            t = self._trabalhos.get(chave)
+            if t is not None and not t.falhou and (not t.concluido or t.disponivel): return t, False
+            t = TrabalhoExportacao(chave); novo = False
+            for nome, (ext, funcao, args) in tarefas.items():
+                p = self.cache.obter(chave, ext)
+                if p is not None:
+                    f = Future(); f.set_result(p)
+                else:
+                    f = self._pool.submit(self._gerar, chave, ext, funcao, args); novo = True
+                t.futuros[nome] = f
+            self._trabalhos[chave] = t
+            if len(self._trabalhos) > MAX_TRABALHOS:
+                for k in [k for k, v in self._trabalhos.items() if v.concluido][:len(self._trabalhos) - MAX_TRABALHOS]:
+                    del self._trabalhos[k]
+            return t, novo
+
+    def trabalho(self, chave):
+        return self._trabalhos.get(chave) if chave else None
@@ -0,0 +1,243 @@
+"""Consulta indexada e paginada do histórico de movimentações.
+
+Os segmentos CSV do ``LogEventos`` continuam sendo a fonte dos dados; aqui
+fica um índice SQLite ao lado deles (``historico_log.idx.db``), alimentado de
+forma incremental: cada sincronização lê só os bytes anexados desde a última.
+
+Os eventos ficam em partições mensais (``eventos_AAAAMM``) com índices em
+``Data``, ``(Produto, Data)``, ``(Tipo, Data)`` e ``(Usuario, Data)``; uma
+consulta com período só abre as partições do período. A tabela ``diario``
+guarda a quantidade movimentada por dia, produto, destino e tipo, somada na
+ingestão.
+"""
+import csv
+import os
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from .concorrencia import TravaArquivo
+from .log import COLUNAS_LOG
+
+POR_PAGINA = 50
+COLUNAS_DIARIO = ["Dia", "Produto", "Detalhe", "Tipo", "Quantidade", "Eventos"]
+
+
+def _dia(valor):
+    if valor is None: return None
+    if isinstance(valor, (date, datetime)): return valor.strftime("%Y-%m-%d")
+    return str(valor)[:10]
+
+
+def _mes(data):
+    return data[0:4] + data[5:7] if len(data) >= 7 and data[0:4].isdigit() and data[5:7].isdigit() else "000000"
+
+
+def _numero(v):
+    try: return float(str(v).replace(",", "."))
+    except ValueError: return 0.0
+
+
+def _ler_desde(caminho, inicio):
+    """Linhas completas do CSV a partir do byte ``inicio``. Devolve (linhas, byte seguinte à última lida)."""
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        dados = f.read()
+    fim = dados.rfind(b"\n") + 1
+    texto = dados[:fim].decode("utf-8", errors="replace")
+    linhas = []
+    for r in csv.reader(texto.splitlines()):
+        if not r or r == COLUNAS_LOG: continue
+        r = (r + [""] * len(COLUNAS_LOG))[:len(COLUNAS_LOG)]
+        linhas.append(r)
+    return linhas, inicio + fim
+
+
+@dataclass
+class PaginaHistorico:
+    linhas: pd.DataFrame
+    total: int
+    pagina: int
+    por_pagina: int
+
+    @property
+    def paginas(self):
+        return max(1, -(-self.total // self.por_pagina))
+
+
+class IndiceHistorico:
+    def __init__(self, log, caminho=None):
+        self.log = log
+        self.caminho = caminho or os.path.splitext(log.caminho)[0] + ".idx.db"
+        self._assinatura = None
+        self._pronto = False
+
+    @contextmanager
+    def conexao(self):
+        con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+        try:
+            if not self._pronto: self._criar_schema(con)
+            yield con
+        finally:
+            con.close()
+
+    def _criar_schema(self, con):
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor INTEGER)")
+        con.execute("CREATE TABLE IF NOT EXISTS segmentos (nome TEXT PRIMARY KEY)")
+        con.execute("CREATE TABLE IF NOT EXISTS particoes (mes TEXT PRIMARY KEY)")
+        con.execute("CREATE TABLE IF NOT EXISTS diario (Dia TEXT, Produto TEXT, Detalhe TEXT, Tipo TEXT, Quantidade REAL, Eventos INTEGER, "
+                    "PRIMARY KEY (Dia, Produto, Detalhe, Tipo))")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_diario_produto ON diario(Produto, Dia)")
+        con.execute("CREATE TABLE IF NOT EXISTS distintos (coluna TEXT, valor TEXT, PRIMARY KEY (coluna, valor))")
+        self._pronto = True
+
+    def _criar_particao(self, con, mes):
+        t = f"eventos_{mes}"
+        con.execute(f"CREATE TABLE IF NOT EXISTS {t} (id INTEGER PRIMARY KEY, Data TEXT, Produto TEXT, Quantidade REAL, Tipo TEXT, Detalhe TEXT, Usuario TEXT)")
+        con.execute(f"CREATE INDEX IF NOT EXISTS ix_{t}_data ON {t}(Data)")
+        for c in ("Produto", "Tipo", "Usuario"):
+            con.execute(f"CREATE INDEX IF NOT EXISTS ix_{t}_{c.lower()} ON {t}({c}, Data)")
+        con.execute("INSERT OR IGNORE INTO particoes VALUES (?)", (mes,))
+
+    # --- INGESTÃO ---
+    def _segmentos(self):
+        """(fechados, ativo, assinatura) do log neste instante."""
+        segmentos = self.log.segmentos()
+        ativo = segmentos[-1] if segmentos and segmentos[-1] == self.log.caminho else None
+        fechados = segmentos[:-1] if ativo else segmentos
+        return fechados, ativo, (tuple(fechados), os.path.getsize(ativo) if ativo else -1)
+
+    def sincronizar(self):
+        """Indexa o que foi anexado ao log desde a última chamada. Retorna o nº de eventos novos."""
+        if self._segmentos()[2] == self._assinatura: return 0
+
+        with self.conexao() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                ingeridos = {r[0] for r in con.execute("SELECT nome FROM segmentos")}
+                linha = con.execute("SELECT valor FROM controle WHERE chave = 'offset_ativo'").fetchone()
+                offset = linha[0] if linha else 0
+                novos = []
+                # listagem e leitura sob a trava do log: uma rotação entre as duas faria o offset lido
+                # do novo ativo valer, na próxima vez, para o segmento que acabou de ser fechado
+                with TravaArquivo(self.log.caminho + ".lock"):
+                    fechados, ativo, assinatura = self._segmentos()
+                    # o primeiro segmento fechado ainda não indexado é o antigo ativo: continua de onde parou
+                    for i, p in enumerate(p for p in fechados if os.path.basename(p) not in ingeridos):
+                        novos += _ler_desde(p, offset if i == 0 else 0)[0]
+                        con.execute("INSERT INTO segmentos VALUES (?)", (os.path.basename(p),))
+                        offset = 0
+                    if ativo:
+                        if os.path.getsize(ativo) < offset: offset = 0
+                        lidas, offset = _ler_desde(ativo, offset)
+                        novos += lidas
+                con.execute("INSERT OR REPLACE INTO controle VALUES ('offset_ativo', ?)", (offset,))
+                self._inserir(con, novos)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        self._assinatura = assinatura
+        return len(novos)
+
+    def _inserir(self, con, linhas):
+        por_mes, diario, distintos = {}, {}, set()
+        for data, produto, qtd, tipo, detalhe, usuario in linhas:
+            distintos.update((("Produto", produto), ("Tipo", tipo), ("Usuario", usuario)))
+            q = _numero(qtd)
+            por_mes.setdefault(_mes(data), []).append((data, produto, q, tipo, detalhe, usuario))
+            k = (data[:10], produto, detalhe, tipo)
+            soma, n = diario.get(k, (0.0, 0))
+            diario[k] = (soma + q, n + 1)
+        for mes, valores in por_mes.items():
+            self._criar_particao(con, mes)
+            con.executemany(f"INSERT INTO eventos_{mes} (Data, Produto, Quantidade, Tipo, Detalhe, Usuario) VALUES (?, ?, ?, ?, ?, ?)", valores)
+        con.executemany("INSERT INTO diario VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (Dia, Produto, Detalhe, Tipo) "
+                        "DO UPDATE SET Quantidade = Quantidade + excluded.Quantidade, Eventos = Eventos + excluded.Eventos",
+                        [k + v for k, v in diario.items()])
+        con.executemany("INSERT OR IGNORE INTO distintos VALUES (?, ?)", distintos)
+
+    # --- CONSULTA ---
+    def _particoes(self, con, inicio, fim):
+        meses = [r[0] for r in con.execute("SELECT mes FROM particoes ORDER BY mes DESC")]
+        if inicio: meses = [m for m in meses if m >= _mes(inicio) or m == "000000"]
+        if fim: meses = [m for m in meses if m <= _mes(fim)]
+        return meses
+
+    def _filtros(self, produto, tipo, usuario, inicio, fim):
+        conds, params = [], []
+        for col, v in (("Produto", produto), ("Tipo", tipo), ("Usuario", usuario)):
+            if v is not None: conds.append(f"{col} = ?"); params.append(v)
+        if inicio: conds.append("Data >= ?"); params.append(inicio)
+        if fim: conds.append("Data < ?"); params.append(fim)
+        return ("WHERE " + " AND ".join(conds)) if conds else "", params
+
+    def consultar(self, produto=None, tipo=None, usuario=None, inicio=None, fim=None, pagina=1, por_pagina=POR_PAGINA):
+        """Eventos filtrados, do mais recente para o mais antigo. ``inicio``/``fim`` são dias inclusivos."""
+        self.sincronizar()
+        inicio = _dia(inicio)
+        fim = _dia(datetime.strptime(_dia(fim), "%Y-%m-%d") + timedelta(days=1)) if fim else None
+        where, params = self._filtros(produto, tipo, usuario, inicio, fim)
+        pular, faltam = (max(pagina, 1) - 1) * por_pagina, por_pagina
+        partes, total = [], 0
+        with self.conexao() as con:
+            con.execute("BEGIN")
+            try:
+                for mes in self._particoes(con, inicio, fim):
+                    t = f"eventos_{mes}"
+                    n = con.execute(f"SELECT COUNT(*) FROM {t} {where}", params).fetchone()[0]
+                    total += n
+                    if faltam == 0 or pular >= n:
+                        pular -= min(pular, n); continue
+                    partes += con.execute(f"SELECT Data, Produto, Quantidade, Tipo, Detalhe, Usuario FROM {t} {where} "
+                                          f"ORDER BY Data DESC, id DESC LIMIT ? OFFSET ?", params + [faltam, pular]).fetchall()
+                    faltam = por_pagina - len(partes); pular = 0
+            finally: con.execute("COMMIT")
+        return PaginaHistorico(pd.DataFrame(partes, columns=COLUNAS_LOG), total, max(pagina, 1), por_pagina)
+
+    def eventos_desde(self, cursor=None, tipos=None):
+        """Eventos indexados depois de ``cursor`` ({partição: último id lido}), em ordem de ingestão.
+
+        Devolve (DataFrame com ``COLUNAS_LOG``, cursor novo). Serve para quem mantém agregados
+        próprios e só quer processar o que chegou desde a última vez.
+        """
+        self.sincronizar()
+        cursor = dict(cursor or {})
+        filtro, extra = "", []
+        if tipos:
+            filtro = f" AND Tipo IN ({', '.join('?' for _ in tipos)})"; extra = list(tipos)
+        partes = []
+        with self.conexao() as con:
+            con.execute("BEGIN")
+            try:
+                for mes in reversed(self._particoes(con, None, None)):
+                    t, ultimo = f"eventos_{mes}", cursor.get(mes, 0)
+                    maximo = con.execute(f"SELECT MAX(id) FROM {t}").fetchone()[0] or 0
+                    if maximo <= ultimo: continue
+                    partes += con.execute(f"SELECT Data, Produto, Quantidade, Tipo, Detalhe, Usuario FROM {t} "
+                                          f"WHERE id > ? AND id <= ?{filtro} ORDER BY id", [ultimo, maximo] + extra).fetchall()
+                    cursor[mes] = maximo
+            finally: con.execute("COMMIT")
+        return pd.DataFrame(partes, columns=COLUNAS_LOG), cursor
+
+    def agregados_diarios(self, produto=None, tipo=None, inicio=None, fim=None):
+        """Quantidade movimentada e nº de eventos por dia, produto, destino (``Detalhe``) e tipo."""
+        self.sincronizar()
+        conds, params = [], []
+        for col, v in (("Produto", produto), ("Tipo", tipo)):
+            if v is not None: conds.append(f"{col} = ?"); params.append(v)
+        if inicio: conds.append("Dia >= ?"); params.append(_dia(inicio))
+        if fim: conds.append("Dia <= ?"); params.append(_dia(fim))
+        where = ("WHERE " + " AND ".join(conds)) if conds else ""
+        with self.conexao() as con:
+            return pd.read_sql_query(f"SELECT {', '.join(COLUNAS_DIARIO)} FROM diario {where} ORDER BY Dia", con, params=params)
+
+    def valores(self, coluna):
+        """Valores distintos de ``Produto``, ``Tipo`` ou ``Usuario`` (para os filtros da tela)."""
+        self.sincronizar()
+        with self.conexao() as con:
+            return [r[0] for r in con.execute("SELECT valor FROM distintos WHERE coluna = ? ORDER BY valor", (coluna,))]
@@ -0,0 +1,165 @@
+"""Importação em lote das planilhas de contagem e do cadastro mestre.
+
+Em vez de ``iterrows`` + ``pd.concat`` por produto novo, a planilha inteira é
+tratada de uma vez: números limpos por coluna, correspondência por join de
+hash (código e depois nome, via ``IndiceProdutos.localizar_varios``),
+atualizações aplicadas com uma atribuição por coluna e todos os produtos
+novos anexados num único concat.
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from .armazenamento import anexar
+from .esquema import atribuir
+from .indice import IndiceProdutos, chaves_codigo, chaves_nome
+from .log import nova_linha
+from .metricas import medido
+from .unidades import REGISTRO_PADRAO, colunas_estoque, colunas_minimo
+
+
+def limpar_numeros(serie):
+    """Coluna como float: aceita "R$", espaços e vírgula decimal; o que não for número vira 0."""
+    if is_numeric_dtype(serie) and serie.dtype != bool: return serie.astype(float).fillna(0.0)
+    s = (serie.astype("string").str.lower()
+         .str.replace("r$", "", regex=False).str.replace(" ", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(s, errors="coerce").astype(float).fillna(0.0)
+
+
+def achar_coluna(colunas, chaves):
+    for c in colunas:
+        if any(x in str(c).lower() for x in chaves): return c
+    return None
+
+
+@dataclass
+class RelatorioImportacao:
+    atualizados: list = field(default_factory=list)   # rótulos do cadastro que receberam valores
+    novos: list = field(default_factory=list)         # nomes dos produtos cadastrados agora
+    ignorados: list = field(default_factory=list)     # linhas da planilha sem nome de produto
+
+    @property
+    def processados(self):
+        return len(self.atualizados) + len(self.novos)
+
+    def somar(self, outro):
+        self.atualizados += outro.atualizados; self.novos += outro.novos; self.ignorados += outro.ignorados
+        return self
+
+
+def _texto(serie):
+    s = serie.astype("string").str.strip()
+    return s.mask((s == "") | (s.str.lower() == "nan"))
+
+
+def _nomes_validos(serie):
+    nomes = _texto(serie)
+    return nomes, nomes.notna()
+
+
+def _separar(up, indice):
+    """Divide a planilha normalizada em (atualizações, produtos novos)."""
+    up = up.assign(_rot=indice.localizar_varios(up["Codigo"], up["Produto"]))
+    achados = up[up["_rot"].notna()].drop_duplicates("_rot", keep="last")
+    resto = up[up["_rot"].isna()]
+    # linhas repetidas do mesmo produto novo viram um cadastro só: o nome é o da
+    # primeira, os valores os da última (como se a primeira tivesse sido inserida antes)
+    chave = chaves_codigo(resto["Codigo"]).fillna("\0" + chaves_nome(resto["Produto"]))
+    novos = resto[~chave.duplicated(keep="last")].drop(columns="_rot")
+    primeiro = resto.loc[~chave.duplicated(keep="first"), "Produto"]
+    novos["Produto"] = chave[novos.index].map(pd.Series(primeiro.to_numpy(), index=chave[primeiro.index].to_numpy()))
+    return achados, novos
+
+
+def _anexar_novos(df_db, novos, indice):
+    if novos.empty: return df_db
+    df = anexar(df_db, novos)
+    indice.adicionar_varios(df.iloc[-len(novos):])
+    return df
+
+
+# =================================================================================
+# CONTAGEM (Estoque)
+# =================================================================================
+def importar_contagem(df_db, planilha, col_codigo, col_nome, col_qtd, col_dest, indice=None):
+    """Grava a quantidade contada em ``col_dest``. Altera ``df_db`` e devolve (df, relatório)."""
+    if indice is None: indice = IndiceProdutos(df_db)
+    nomes, validos = _nomes_validos(planilha[col_nome])
+    rel = RelatorioImportacao(ignorados=planilha.index[~validos].tolist())
+    up = pd.DataFrame({"Codigo": _texto(planilha[col_codigo]), "Produto": nomes, "Qtd": limpar_numeros(planilha[col_qtd])})[validos]
+
+    achados, novos = _separar(up, indice)
+    rotulos = achados["_rot"].astype("int64").to_numpy()
+    if len(rotulos): atribuir(df_db, rotulos, col_dest, achados["Qtd"].to_numpy())
+    rel.atualizados = rotulos.tolist()
+
+    if not novos.empty:
+        novos = pd.DataFrame({
+            "Codigo": novos["Codigo"], "Produto": novos["Produto"], "Categoria": "Novo", "Fornecedor": "Geral", "Padrao": "Un",
+            "Custo": 0.0, **dict.fromkeys(colunas_minimo(df_db.columns) + colunas_estoque(df_db.columns), 0.0)
+        })
+        novos[col_dest] = up.loc[novos.index, "Qtd"]
+        rel.novos = novos["Produto"].tolist()
+    return _anexar_novos(df_db, novos, indice), rel
+
+
+@medido()
+def importar_contagem_em_blocos(df_db, blocos, col_codigo, col_nome, col_qtd, col_dest, indice=None, progresso=None):
+    """``importar_contagem`` sobre os blocos de ``PlanilhaContagem.blocos()``.
+
+    O índice é reaproveitado entre blocos, então um produto novo num bloco é
+    encontrado pelos seguintes. ``progresso(fração, linhas_lidas)`` é chamado a cada bloco.
+    """
+    if indice is None: indice = IndiceProdutos(df_db)
+    rel = RelatorioImportacao(); linhas = 0
+    for bloco, fracao in blocos:
+        df_db, r = importar_contagem(df_db, bloco, col_codigo, col_nome, col_qtd, col_dest, indice)
+        rel.somar(r); linhas += len(bloco)
+        if progresso: progresso(fracao, linhas)
+    return df_db, rel
+
+
+def linhas_contagem(df_db, rel, col_dest, local, usuario="Sistema"):
+    """Linhas de log "Contagem" (saldo contado de cada produto) de uma importação já aplicada em ``df_db``."""
+    rotulos = pd.Index(rel.atualizados).append(df_db.index[df_db.index < 0]).unique()
+    d = df_db.loc[rotulos, ["Produto", col_dest]]
+    return [nova_linha(p, q, "Contagem", local, usuario) for p, q in d.itertuples(index=False)]
+
+
+# =================================================================================
+# CADASTRO MESTRE (Produtos)
+# =================================================================================
+@medido()
+def importar_cadastro(df_db, planilha, categoria, indice=None, unidades=REGISTRO_PADRAO):
+    """Atualiza/cadastra produtos a partir da planilha do fornecedor. Devolve (df, relatório).
+
+    O mínimo de cada hospital vem da coluna da planilha que cita uma das palavras da unidade.
+    """
+    if indice is None: indice = IndiceProdutos(df_db)
+    cols = planilha.columns
+    cc = achar_coluna(cols, ['código', 'codigo']); cn = achar_coluna(cols, ['produto 1', 'nome']); cf = achar_coluna(cols, ['fornec'])
+    cp = achar_coluna(cols, ['padr']); ccst = achar_coluna(cols, ['cust'])
+    if cn is None: raise ValueError("coluna de nome do produto não encontrada na planilha")
+
+    nomes, validos = _nomes_validos(planilha[cn])
+    rel = RelatorioImportacao(ignorados=planilha.index[~validos].tolist())
+    textos = {"Codigo": cc, "Fornecedor": cf, "Padrao": cp}
+    numeros = {"Custo": ccst, **{u.coluna_minimo: achar_coluna(cols, [p.lower() for p in u.palavras]) if u.palavras else None for u in unidades.destinos}}
+    d = pd.DataFrame({"Produto": nomes, "Categoria": categoria}, index=planilha.index)
+    for c, orig in textos.items(): d[c] = _texto(planilha[orig]) if orig else pd.NA
+    for c, orig in numeros.items(): d[c] = limpar_numeros(planilha[orig]) if orig else 0.0
+    d = d[validos]
+
+    achados, novos = _separar(d, indice)
+    rotulos = achados["_rot"].astype("int64").to_numpy()
+    if len(rotulos):
+        # só as colunas presentes na planilha são atualizadas; o nome fica o do cadastro
+        presentes = ["Categoria"] + [c for c, orig in {**textos, **numeros}.items() if orig]
+        for c in presentes: atribuir(df_db, rotulos, c, achados[c].to_numpy())
+    rel.atualizados = rotulos.tolist()
+
+    if not novos.empty:
+        novos = novos.assign(**dict.fromkeys(colunas_estoque(df_db.columns), 0.0))
+        rel.novos = novos["Produto"].tolist()
+    return _anexar_novos(df_db, novos, indice), rel
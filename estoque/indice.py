@@ -0,0 +1,99 @@
+"""Índice hash do cadastro: código / código único / nome -> rótulo da linha.
+
+Substitui as buscas ``df[df['Produto'] == nome]`` (uma varredura do cadastro
+inteiro por item) por consultas O(1) em dicionários. Quando mais de uma linha
+casa com a mesma chave vale a primeira, como no ``.index[0]`` das telas.
+"""
+import numpy as np
+import pandas as pd
+
+
+def chave_codigo(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)): return None
+    s = str(valor).strip()
+    # códigos lidos como número do Excel/CSV chegam como "123.0"
+    if s.endswith(".0") and s[:-2].isdigit(): s = s[:-2]
+    return s if s and s.lower() != "nan" else None
+
+
+def chave_nome(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)): return None
+    s = " ".join(str(valor).split()).casefold()
+    return s if s and s != "nan" else None
+
+
+def chaves_codigo(serie):
+    """Versão vetorizada de ``chave_codigo``."""
+    s = serie.astype("string").str.strip().str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    return s.mask((s == "") | (s.str.lower() == "nan"))
+
+
+def chaves_nome(serie):
+    """Versão vetorizada de ``chave_nome``."""
+    s = serie.astype("string").str.replace(r"\s+", " ", regex=True).str.strip().str.casefold()
+    return s.mask((s == "") | (s == "nan"))
+
+
+class IndiceProdutos:
+    def __init__(self, df=None):
+        self.codigos = {}
+        self.nomes = {}
+        if df is not None: self.adicionar_varios(df)
+
+    def _registrar(self, rot, codigo, codigo_unico, produto):
+        for k in (chave_codigo(codigo), chave_codigo(codigo_unico)):
+            if k: self.codigos.setdefault(k, rot)
+        n = chave_nome(produto)
+        if n: self.nomes.setdefault(n, rot)
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def copia(self):
+        """Cópia independente, para quem vai ``adicionar`` sem mexer no índice compartilhado da versão."""
+        novo = IndiceProdutos()
+        novo.codigos, novo.nomes = dict(self.codigos), dict(self.nomes)
+        return novo
+
+    def por_codigo(self, codigo):
+        k = chave_codigo(codigo)
+        return self.codigos.get(k) if k else None
+
+    def por_nome(self, nome):
+        k = chave_nome(nome)
+        return self.nomes.get(k) if k else None
+
+    def localizar_varios(self, codigos, nomes):
+        """Rótulos dos produtos pelo código (Codigo ou Codigo_Unico) e, onde não achar, pelo nome.
+
+        ``codigos`` e ``nomes`` são Series alinhadas: um join por hash no código e outro no nome.
+
+        Devolve uma Series ``Int64`` de rótulos (<NA> onde não houve correspondência);
+        os dois backends usam rótulos inteiros.
+        """
+        rot = chaves_codigo(codigos).map(self.codigos).astype("Int64")
+        falta = rot.isna()
+        if falta.any(): rot[falta] = chaves_nome(nomes[falta]).map(self.nomes).astype("Int64")
+        return rot
+
+    def rotulos_por_nome(self, nomes):
+        return chaves_nome(nomes).map(self.nomes).astype("Int64")
+
+    def adicionar(self, rot, linha):
+        self._registrar(rot, linha.get("Codigo"), linha.get("Codigo_Unico"), linha.get("Produto"))
+
+    def adicionar_varios(self, df):
+        """``adicionar`` para um frame inteiro; as chaves são calculadas de forma vetorizada."""
+        if not len(df): return
+        def chaves(col, f):
+            if col not in df.columns: return np.full(len(df), None, dtype=object)
+            return f(df[col]).to_numpy(object, na_value=None)
+        rotulos = df.index.to_numpy()
+        # Codigo e Codigo_Unico intercalados para manter "primeira linha que casar com qualquer um"
+        cods = np.column_stack([chaves("Codigo", chaves_codigo), chaves("Codigo_Unico", chaves_codigo)]).ravel()
+        rots = np.repeat(rotulos, 2)
+        ok = cods != None  # noqa: E711 (comparação elemento a elemento)
+        for k, r in zip(cods[ok].tolist(), rots[ok].tolist()): self.codigos.setdefault(k, r)
+        nomes = chaves("Produto", chaves_nome)
+        ok = nomes != None  # noqa: E711
+        for k, r in zip(nomes[ok].tolist(), rotulos[ok].tolist()): self.nomes.setdefault(k, r)
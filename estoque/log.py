@@ -0,0 +1,102 @@
+"""Log de movimentações append-only, com segmentos rotacionados.
+
+O segmento ativo é sempre ``historico_log.csv``; quando passa de
+``TAMANHO_SEGMENTO`` bytes ele é renomeado para ``historico_log.00001.csv``,
+``historico_log.00002.csv``... e um novo segmento ativo é criado. Cada
+gravação é um único ``write`` em modo append seguido de ``fsync``, então
+registrar um item custa O(1), não O(histórico). Rotação e gravação ficam sob
+uma trava de arquivo (``historico_log.csv.lock``), para que dois processos não
+rotacionem ao mesmo tempo nem escrevam o cabeçalho duas vezes.
+"""
+import csv
+import glob
+import io
+import os
+import re
+from datetime import datetime
+
+from .concorrencia import TravaArquivo
+from .metricas import medido
+
+COLUNAS_LOG = ["Data", "Produto", "Quantidade", "Tipo", "Detalhe", "Usuario"]
+TAMANHO_SEGMENTO = 5 * 1024 * 1024
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def nova_linha(produto, quantidade, tipo, origem_destino, usuario="Sistema", data=None):
+    data = data or datetime.now()
+    if isinstance(data, datetime): data = data.strftime(FORMATO_DATA)
+    return {"Data": data, "Produto": produto, "Quantidade": quantidade, "Tipo": tipo, "Detalhe": origem_destino, "Usuario": usuario}
+
+
+class LogEventos:
+    def __init__(self, caminho, tamanho_segmento=TAMANHO_SEGMENTO):
+        self.caminho = caminho
+        self.tamanho_segmento = tamanho_segmento
+        base, ext = os.path.splitext(caminho)
+        self._base, self._ext = base, ext or ".csv"
+
+    # --- SEGMENTOS ---
+    def _fechados(self):
+        padrao = re.compile(re.escape(os.path.basename(self._base)) + r"\.(\d+)" + re.escape(self._ext) + "$")
+        achados = []
+        for p in glob.glob(glob.escape(self._base) + ".*" + self._ext):
+            m = padrao.search(os.path.basename(p))
+            if m: achados.append((int(m.group(1)), p))
+        return sorted(achados)
+
+    def segmentos(self):
+        """Segmentos fechados em ordem cronológica, seguidos do ativo (se existir)."""
+        lista = [p for _, p in self._fechados()]
+        if os.path.exists(self.caminho): lista.append(self.caminho)
+        return lista
+
+    def rotacionar(self):
+        if not os.path.exists(self.caminho) or os.path.getsize(self.caminho) == 0: return None
+        fechados = self._fechados()
+        n = fechados[-1][0] + 1 if fechados else 1
+        destino = f"{self._base}.{n:05d}{self._ext}"
+        os.replace(self.caminho, destino)
+        return destino
+
+    # --- ESCRITA ---
+    def _termina_em_quebra(self):
+        with open(self.caminho, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @medido()
+    def registrar(self, linhas):
+        """Anexa as linhas num único write + fsync. Retorna quantas foram gravadas."""
+        linhas = list(linhas)
+        if not linhas: return 0
+        with TravaArquivo(self.caminho + ".lock"):
+            self._anexar(linhas)
+        return len(linhas)
+
+    def _anexar(self, linhas):
+        try: tamanho = os.path.getsize(self.caminho)
+        except OSError: tamanho = 0
+        if tamanho >= self.tamanho_segmento:
+            self.rotacionar(); tamanho = 0
+
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=COLUNAS_LOG, extrasaction="ignore", lineterminator="\n")
+        if tamanho == 0: w.writeheader()
+        elif not self._termina_em_quebra(): buf.write("\n")
+        w.writerows(linhas)
+        dados = buf.getvalue().encode("utf-8")
+
+        fd = os.open(self.caminho, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, dados)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- LEITURA ---
+    def ler(self):
+        import pandas as pd
+        partes = [pd.read_csv(p) for p in self.segmentos() if os.path.getsize(p) > 0]
+        if not partes: return pd.DataFrame(columns=COLUNAS_LOG)
+        return pd.concat(partes, ignore_index=True)
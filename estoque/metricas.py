@@ -0,0 +1,114 @@
+"""Tempos de execução das telas e das operações do núcleo.
+
+``METRICAS`` começa desligado e só liga com ``METRICAS.configurar(caminho)``;
+o app faz isso quando ``ESTOQUE_METRICAS`` aponta para um arquivo, para medir
+uma versão (o arquivo não é rotacionado: não deixe ligado em produção). A
+partir daí, cada ``medir`` (ou função decorada com ``@medido``) anexa uma
+linha ao CSV de métricas: data, versão do código, tipo (``tela``,
+``operacao``, ``benchmark``), nome, nº de linhas processadas e segundos. A
+versão é o ``git describe`` do código (ou ``ESTOQUE_VERSAO``), então o mesmo
+arquivo acumula execuções de versões diferentes e ``resumo``/``comparar``
+mostram o que ficou mais lento. Desligado, medir custa um teste de atributo.
+"""
+import csv
+import functools
+import io
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from .concorrencia import TravaArquivo
+
+COLUNAS_METRICAS = ["Data", "Versao", "Tipo", "Nome", "Linhas", "Segundos"]
+
+
+@functools.lru_cache(maxsize=None)
+def versao_codigo():
+    """Commit do código em execução (``git describe --always --dirty``), ``ESTOQUE_VERSAO`` ou "desconhecida"."""
+    if os.environ.get("ESTOQUE_VERSAO"): return os.environ["ESTOQUE_VERSAO"]
+    try:
+        r = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True, timeout=5)
+        return r.stdout.strip() or "desconhecida"
+    except (OSError, subprocess.SubprocessError): return "desconhecida"
+
+
+def _linhas(args):
+    """Tamanho do primeiro argumento que for tabela ou lista (o volume de dados da chamada)."""
+    return next((len(a) for a in args if isinstance(a, (pd.DataFrame, list, tuple))), None)
+
+
+class Metricas:
+    def __init__(self, caminho=None, versao=None):
+        self.caminho = caminho
+        self.versao = versao
+        self._trava = threading.Lock()
+
+    @property
+    def ativo(self):
+        return bool(self.caminho)
+
+    def configurar(self, caminho, versao=None):
+        """Passa a gravar em ``caminho`` (None desliga)."""
+        self.caminho, self.versao = caminho, versao
+
+    def registrar(self, tipo, nome, segundos, linhas=None):
+        if not self.caminho: return
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), self.versao or versao_codigo(),
+                                                       tipo, nome, "" if linhas is None else linhas, f"{segundos:.6f}"])
+        with self._trava, TravaArquivo(self.caminho + ".lock"):
+            novo = not os.path.exists(self.caminho) or os.path.getsize(self.caminho) == 0
+            with open(self.caminho, "a", newline="", encoding="utf-8") as f:
+                f.write((",".join(COLUNAS_METRICAS) + "\n" if novo else "") + buf.getvalue())
+
+    @contextmanager
+    def medir(self, tipo, nome, linhas=None):
+        """Registra o tempo do bloco, mesmo que ele termine com exceção (``st.rerun``/``st.stop`` inclusive)."""
+        if not self.caminho:
+            yield; return
+        inicio = time.perf_counter()
+        try: yield
+        finally: self.registrar(tipo, nome, time.perf_counter() - inicio, linhas)
+
+    def ler(self):
+        try: return pd.read_csv(self.caminho, dtype={"Versao": str})
+        except (OSError, ValueError, pd.errors.EmptyDataError): return pd.DataFrame(columns=COLUNAS_METRICAS)
+
+
+METRICAS = Metricas()
+
+
+def medido(nome=None, tipo="operacao"):
+    """Decorador: mede cada chamada em ``METRICAS`` como ``nome`` (padrão: ``modulo.funcao``)."""
+    def decorar(funcao):
+        rotulo = nome or f"{funcao.__module__.rsplit('.', 1)[-1]}.{funcao.__qualname__}"
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not METRICAS.ativo: return funcao(*args, **kwargs)
+            with METRICAS.medir(tipo, rotulo, _linhas(args)): return funcao(*args, **kwargs)
+        return medida
+    return decorar
+
+
+def resumo(df):
+    """Por (Versao, Tipo, Nome, Linhas): nº de medições e mediana, p95 e máximo em milissegundos."""
+    if df.empty: return pd.DataFrame(columns=["Versao", "Tipo", "Nome", "Linhas", "N", "Mediana_ms", "P95_ms", "Max_ms"])
+    ms = df.assign(ms=pd.to_numeric(df["Segundos"], errors="coerce") * 1000, Linhas=df["Linhas"].fillna(-1))
+    g = ms.groupby(["Versao", "Tipo", "Nome", "Linhas"], sort=False)["ms"]
+    out = pd.DataFrame({"N": g.size(), "Mediana_ms": g.median(), "P95_ms": g.quantile(0.95), "Max_ms": g.max()}).reset_index()
+    out["Linhas"] = out["Linhas"].astype("int64").where(out["Linhas"] >= 0)
+    return out
+
+
+def comparar(df, base, nova):
+    """Mediana de cada (Tipo, Nome, Linhas) na versão ``nova`` contra a ``base``; ``Razao`` > 1 é regressão."""
+    r = resumo(df[df["Versao"].isin([base, nova])])
+    t = r.pivot_table(index=["Tipo", "Nome", "Linhas"], columns="Versao", values="Mediana_ms", dropna=False)
+    t = t.reindex(columns=[base, nova]).dropna()
+    return t.assign(Razao=t[nova] / t[base]).reset_index()
@@ -0,0 +1,124 @@
+"""Leitura em blocos das planilhas de contagem (CSV e XLSX).
+
+O cabeçalho é procurado só nas primeiras ``LINHAS_CABECALHO`` linhas e o
+corpo é lido em blocos de ``TAMANHO_BLOCO`` linhas (``chunksize`` no CSV,
+modo ``read_only`` do openpyxl no XLSX), então a memória usada não cresce
+com o tamanho do arquivo.
+"""
+import csv
+import io
+import itertools
+import os
+
+import pandas as pd
+
+LINHAS_CABECALHO = 20
+TAMANHO_BLOCO = 20000
+
+
+def eh_cabecalho(valores):
+    return any("código" in str(x).lower() or "produto" in str(x).lower() for x in valores)
+
+
+def _nomes_colunas(valores):
+    # mesmo padrão do pandas: vazias viram "Unnamed: i", repetidas ganham ".1", ".2"...
+    nomes, vistos = [], {}
+    for i, v in enumerate(valores):
+        n = f"Unnamed: {i}" if v is None or str(v).strip() == "" else str(v)
+        if n in vistos:
+            vistos[n] += 1; n = f"{n}.{vistos[n]}"
+        else: vistos[n] = 0
+        nomes.append(n)
+    return nomes
+
+
+class PlanilhaContagem:
+    def __init__(self, arquivo, nome=None, tamanho_bloco=TAMANHO_BLOCO):
+        self.arquivo = arquivo
+        self.nome = nome or getattr(arquivo, "name", str(arquivo))
+        self.tamanho_bloco = tamanho_bloco
+        self.excel = not self.nome.lower().endswith(".csv")
+        self.linha_cabecalho = 0
+        self.colunas = []
+        if self.excel: self._sniff_excel()
+        else: self._sniff_csv()
+
+    def _abrir(self):
+        if isinstance(self.arquivo, (str, os.PathLike)): return open(self.arquivo, "rb")
+        self.arquivo.seek(0)
+        return self.arquivo
+
+    def _fechar(self, f):
+        if f is not self.arquivo: f.close()
+
+    def _tamanho(self, f):
+        atual = f.tell(); f.seek(0, os.SEEK_END); fim = f.tell(); f.seek(atual)
+        return fim or 1
+
+    # --- CSV ---
+    def _sniff_csv(self):
+        f = self._abrir()
+        try:
+            texto = io.TextIOWrapper(f, encoding="utf-8", errors="replace", newline="")
+            try:
+                prefixo = list(itertools.islice(csv.reader(texto), LINHAS_CABECALHO))
+            finally:
+                texto.detach()
+            self.linha_cabecalho = next((i for i, r in enumerate(prefixo) if eh_cabecalho(r)), 0)
+            f.seek(0)
+            self.colunas = pd.read_csv(f, skiprows=self.linha_cabecalho, nrows=0).columns.tolist()
+        finally:
+            self._fechar(f)
+
+    def _blocos_csv(self):
+        f = self._abrir()
+        try:
+            total = self._tamanho(f)
+            leitor = pd.read_csv(f, skiprows=self.linha_cabecalho, dtype=str, chunksize=self.tamanho_bloco)
+            for bloco in leitor:
+                yield bloco, min(1.0, f.tell() / total)
+        finally:
+            self._fechar(f)
+
+    # --- XLSX ---
+    def _planilha_excel(self, f):
+        from openpyxl import load_workbook
+        wb = load_workbook(f, read_only=True, data_only=True)
+        return wb, wb.active
+
+    def _sniff_excel(self):
+        f = self._abrir()
+        try:
+            wb, ws = self._planilha_excel(f)
+            prefixo = list(ws.iter_rows(max_row=LINHAS_CABECALHO, values_only=True))
+            wb.close()
+        finally:
+            self._fechar(f)
+        self.linha_cabecalho = next((i for i, r in enumerate(prefixo) if eh_cabecalho(r)), 0)
+        self.colunas = _nomes_colunas(prefixo[self.linha_cabecalho]) if prefixo else []
+
+    def _blocos_excel(self):
+        f = self._abrir()
+        try:
+            wb, ws = self._planilha_excel(f)
+            total = max((ws.max_row or 0) - self.linha_cabecalho - 1, 1)
+            n = len(self.colunas); lidas = 0
+            linhas = ws.iter_rows(min_row=self.linha_cabecalho + 2, values_only=True)
+            while True:
+                lote = [tuple(r[:n]) + (None,) * (n - len(r)) for r in itertools.islice(linhas, self.tamanho_bloco)]
+                if not lote: break
+                bloco = pd.DataFrame(lote, columns=self.colunas, index=pd.RangeIndex(lidas, lidas + len(lote)), dtype=object)
+                lidas += len(lote)
+                yield bloco, min(1.0, lidas / total)
+            wb.close()
+        finally:
+            self._fechar(f)
+
+    def colunas_sugeridas(self):
+        """Posições prováveis das colunas (código, nome, quantidade) pelo nome do cabeçalho; 0 se não achar."""
+        def achar(*chaves): return next((i for i, c in enumerate(self.colunas) if any(k in str(c).lower() for k in chaves)), 0)
+        return achar("cod"), achar("nom", "prod"), achar("qtd", "sald")
+
+    def blocos(self):
+        """Gera (DataFrame do bloco, fração do arquivo já lida)."""
+        return self._blocos_excel() if self.excel else self._blocos_csv()
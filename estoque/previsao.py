@@ -0,0 +1,141 @@
+"""Previsão de demanda e ponto de pedido, vetorizados sobre todos os SKUs.
+
+A demanda semanal de cada produto em cada hospital sai do consumo derivado
+em ``estoque.vendas`` (média móvel ponderada pela cobertura das contagens ou
+suavização exponencial da taxa semanal); sem histórico, vale a
+``Media_Vendas_Semana`` da planilha de referência. O Central não consome: a
+demanda dele é a soma dos hospitais e a posição é o estoque da rede inteira,
+então a sugestão do Central é a quantidade a comprar. As unidades vêm do
+``RegistroUnidades``.
+
+Política de revisão periódica: com prazo ``L`` e intervalo entre pedidos
+``R`` (em semanas), estoque de segurança = z·σ·√L, ponto de pedido = d·L +
+segurança, e quando o estoque está no ponto de pedido ou abaixo a sugestão
+completa até d·(L+R) + z·σ·√(L+R).
+
+Tudo é feito com arrays (produtos x unidades x semanas); ``MotorPrevisao``
+guarda o resultado por versão dos dados e conjunto de parâmetros.
+"""
+import threading
+import warnings
+from dataclasses import dataclass
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from .unidades import REGISTRO_PADRAO
+
+RESULTADOS_MANTIDOS = 8
+
+
+@dataclass(frozen=True)
+class ParametrosPrevisao:
+    metodo: str = "suavizacao"        # ou "media"
+    janela: int = 4                   # semanas da média móvel
+    semanas: int = 26                 # histórico lido
+    alfa: float = 0.3
+    nivel_servico: float = 0.95
+    prazo_compra: float = 2.0         # semanas do pedido ao fornecedor até a entrega
+    prazo_transferencia: float = 0.5  # semanas do Central até o hospital
+    revisao: float = 1.0              # semanas entre um pedido e o próximo
+
+
+def demanda_semanal(consumo, cobertura, janela, alfa):
+    """Arrays (..., semanas) -> (média móvel, suavização exponencial, desvio) da taxa semanal. NaN sem dados."""
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        cob = np.where(cobertura > 0, cobertura, np.nan)
+        taxa = consumo / cob
+        k = np.nansum(cob[..., -janela:], axis=-1)
+        media = np.where(k > 0, np.nansum(np.where(np.isnan(cob), 0, consumo)[..., -janela:], axis=-1) / k, np.nan)
+        suav = np.full(taxa.shape[:-1], np.nan)
+        for t in range(taxa.shape[-1]):
+            x = taxa[..., t]
+            suav = np.where(np.isnan(x), suav, np.where(np.isnan(suav), x, alfa * x + (1 - alfa) * suav))
+        n = np.sum(~np.isnan(taxa), axis=-1)
+        desvio = np.where(n >= 2, np.nanstd(taxa, axis=-1, ddof=1), np.nan)
+    return media, suav, desvio
+
+
+def politica(demanda, desvio, estoque, prazo, revisao, z):
+    """(segurança, ponto de pedido, estoque alvo, sugestão) da revisão periódica, elemento a elemento."""
+    seguranca = z * desvio * np.sqrt(prazo)
+    ponto = demanda * prazo + seguranca
+    alvo = demanda * (prazo + revisao) + z * desvio * np.sqrt(prazo + revisao)
+    sugestao = np.where(estoque <= ponto, np.ceil(np.clip(alvo - estoque, 0, None)), 0)
+    return seguranca, ponto, alvo, sugestao.astype("int64")
+
+
+def calcular_previsao(df_db, consumo, referencia=None, parametros=ParametrosPrevisao(), unidades=REGISTRO_PADRAO):
+    """Uma linha por (produto do cadastro, unidade), com o rótulo do cadastro em ``rot``.
+
+    ``consumo`` é o ``MotorConsumo`` já atualizado; ``referencia`` o frame de ``carregar_referencia``.
+    """
+    p = parametros
+    hospitais = unidades.destinos
+    nomes = [u.nome for u in hospitais]
+    n, S = len(df_db), len(hospitais)
+    produtos = df_db["Produto"].astype(str).to_numpy()
+    chaves = pd.MultiIndex.from_arrays([np.repeat(produtos, S), np.tile(nomes, n)])
+    hist_c, hist_k = consumo.matriz(p.semanas)
+    W = hist_c.shape[1]
+    C = hist_c.reindex(chaves).to_numpy(float).reshape(n, S, W)
+    K = hist_k.reindex(chaves).to_numpy(float).reshape(n, S, W)
+    media, suav, desvio = demanda_semanal(C, K, p.janela, p.alfa)
+
+    d = suav if p.metodo == "suavizacao" else media
+    ref = np.full((n, S), np.nan) if referencia is None or referencia.empty else \
+        referencia["Media_Vendas_Semana"].reindex(chaves).to_numpy(float).reshape(n, S)
+    origem = np.where(~np.isnan(d), "Histórico", np.where(~np.isnan(ref), "Referência", "Sem dados"))
+    d = np.where(np.isnan(d), np.nan_to_num(ref), d)
+    # sem desvio observado: variação de Poisson (σ² = média)
+    desvio = np.where(np.isnan(desvio), np.sqrt(d), desvio)
+    z = NormalDist().inv_cdf(p.nivel_servico)
+
+    est = np.column_stack([pd.to_numeric(df_db[u.coluna_estoque], errors="coerce").fillna(0).to_numpy(float) for u in hospitais]).reshape(n, S)
+    seg, ponto, alvo, sug = politica(d, desvio, est, p.prazo_transferencia, p.revisao, z)
+
+    # Central = compra da rede
+    central = pd.to_numeric(df_db[unidades.central.coluna_estoque], errors="coerce").fillna(0).to_numpy(float)
+    d_c, desvio_c, est_c = d.sum(axis=1), np.sqrt((desvio ** 2).sum(axis=1)), central + est.sum(axis=1)
+    seg_c, ponto_c, alvo_c, sug_c = politica(d_c, desvio_c, est_c, p.prazo_compra, p.revisao, z)
+
+    def juntar(hosp, cent): return np.column_stack([cent, hosp]).ravel()
+    def somar(a): return np.where(np.isnan(a).all(axis=1), np.nan, np.nansum(a, axis=1))
+    return pd.DataFrame({
+        "rot": np.repeat(df_db.index.to_numpy(), S + 1),
+        "Produto": np.repeat(produtos, S + 1),
+        "Unidade": np.tile([unidades.central.nome] + nomes, n),
+        "Estoque": juntar(est, est_c),
+        "Demanda_Media": juntar(media, somar(media)),
+        "Demanda_Suavizada": juntar(suav, somar(suav)),
+        "Demanda": juntar(d, d_c),
+        "Desvio": juntar(desvio, desvio_c),
+        "Origem": juntar(origem, np.select([(origem == "Histórico").any(axis=1), (origem == "Referência").any(axis=1)], ["Histórico", "Referência"], "Sem dados")),
+        "Seguranca": juntar(seg, seg_c),
+        "Ponto_Pedido": juntar(ponto, ponto_c),
+        "Estoque_Alvo": juntar(alvo, alvo_c),
+        "Sugestao": juntar(sug, sug_c),
+    })
+
+
+def sugestao_por_unidade(previsao, unidade):
+    """Sugestão da unidade como Series indexada pelo rótulo do cadastro."""
+    return previsao.loc[previsao["Unidade"] == unidade].set_index("rot")["Sugestao"]
+
+
+class MotorPrevisao:
+    def __init__(self):
+        self._resultados = {}
+        self._trava = threading.Lock()
+
+    def calcular(self, df_db, versao, consumo, referencia=None, parametros=ParametrosPrevisao(), unidades=REGISTRO_PADRAO):
+        """``calcular_previsao`` memorizada por (versão do cadastro, versão do consumo, parâmetros, unidades)."""
+        chave = (versao, consumo.versao, parametros, unidades)
+        with self._trava:
+            if chave in self._resultados: return self._resultados[chave]
+            res = calcular_previsao(df_db, consumo, referencia, parametros, unidades)
+            self._resultados[chave] = res
+            for k in list(self._resultados)[:-RESULTADOS_MANTIDOS]: del self._resultados[k]
+            return res
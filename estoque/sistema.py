@@ -0,0 +1,113 @@
+"""Serviços do sistema de estoque, sem interface.
+
+``Sistema`` junta o que as telas usam: o banco (com a migração única do CSV
+para o SQLite), o cache do cadastro, o log, o índice do histórico, os motores
+de compras, consumo e previsão e a fila de exportação. O app guarda uma
+instância por processo e as telas só falam com ela; scripts e testes de carga
+podem usar a mesma classe sem Streamlit. Cada motor é criado na primeira vez
+que alguém pede, então uma tela não paga pelo que só outra usa.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+from .armazenamento import abrir_banco, migrar_csv_para_sqlite
+from .cache import CacheCadastro
+from .compras import MotorSugestao
+from .concorrencia import TravaArquivo, gravar_com_repeticao
+from .exportacao import FilaExportacao
+from .historico import IndiceHistorico
+from .log import LogEventos, nova_linha
+from .metricas import METRICAS
+from .previsao import MotorPrevisao
+from .vendas import MotorConsumo, carregar_referencia
+
+TIMEOUT_MIGRACAO = 600
+
+
+@dataclass(frozen=True)
+class Configuracao:
+    arquivo_dados: str = "banco_dados.csv"
+    arquivo_banco: str = "banco_dados.db"
+    motor: str = "sqlite"
+    arquivo_log: str = "historico_log.csv"
+    arquivo_referencia: str = "estoque_completo.csv"
+    arquivo_metricas: str = None   # None: métricas desligadas
+
+    @classmethod
+    def do_ambiente(cls):
+        """``ESTOQUE_MOTOR`` (sqlite/csv) e ``ESTOQUE_METRICAS`` (caminho do CSV de métricas; sem ele, desligadas)."""
+        return cls(motor=os.environ.get("ESTOQUE_MOTOR", "sqlite"), arquivo_metricas=os.environ.get("ESTOQUE_METRICAS") or None)
+
+
+def abrir(config):
+    if config.motor != "sqlite": return abrir_banco(config.motor, config.arquivo_dados)
+    # migração única: o primeiro start com SQLite importa o CSV antigo. Processos que sobem juntos
+    # passam pela trava um de cada vez; quem chega depois espera o banco ficar completo e não migra de novo.
+    if os.path.exists(config.arquivo_dados):
+        with TravaArquivo(config.arquivo_banco + ".lock", timeout=TIMEOUT_MIGRACAO):
+            if not os.path.exists(config.arquivo_banco): migrar_csv_para_sqlite(config.arquivo_dados, config.arquivo_banco)
+    return abrir_banco(config.motor, config.arquivo_banco)
+
+
+class Sistema:
+    def __init__(self, config=Configuracao()):
+        self.config = config
+        METRICAS.configurar(config.arquivo_metricas or None)
+        self.banco = abrir(config)
+        self.log = LogEventos(config.arquivo_log)
+        self.cadastro = CacheCadastro(self.banco)
+        self._motores = {}
+        self._trava = threading.RLock()   # um motor pode pedir outro ao ser criado
+
+    def _motor(self, chave, criar):
+        with self._trava:
+            if chave not in self._motores: self._motores[chave] = criar()
+            return self._motores[chave]
+
+    # --- CADASTRO ---
+    def obter(self):
+        """(versão, frame) do cadastro; o frame é compartilhado (ver ``CacheCadastro.obter``)."""
+        with METRICAS.medir("operacao", "carregar_dados"): return self.cadastro.obter()
+
+    def derivado(self, versao, frame, chave, funcao):
+        return self.cadastro.derivado(versao, frame, chave, funcao)
+
+    def unidades(self, versao, frame):
+        # cadastrar unidade muda a versão do banco, então o registro acompanha o frame
+        return self.derivado(versao, frame, "unidades", lambda f: self.banco.unidades())
+
+    def gravar(self, operacao):
+        """``gravar_com_repeticao`` no banco do sistema; ``operacao(df, versao, base)`` devolve (df, resultado)."""
+        with METRICAS.medir("operacao", "gravar"): return gravar_com_repeticao(self.banco, self.cadastro, operacao)
+
+    def adicionar_unidade(self, unidade):
+        self.banco.adicionar_unidade(unidade)
+
+    # --- LOG ---
+    def registrar_log(self, produto, quantidade, tipo, origem_destino, usuario="Sistema"):
+        return self.log.registrar([nova_linha(produto, quantidade, tipo, origem_destino, usuario)])
+
+    def registrar_logs(self, linhas):
+        return self.log.registrar(linhas)
+
+    # --- MOTORES (criados na primeira vez) ---
+    def historico(self):
+        return self._motor("historico", lambda: IndiceHistorico(self.log))
+
+    def motor_compras(self):
+        return self._motor("compras", MotorSugestao)
+
+    def motor_previsao(self):
+        return self._motor("previsao", MotorPrevisao)
+
+    def motor_consumo(self, unidades):
+        return self._motor(("consumo", unidades), lambda: MotorConsumo(self.historico(), carregar_referencia(self.config.arquivo_referencia, unidades), unidades))
+
+    def fila_exportacao(self):
+        return self._motor("exportacao", FilaExportacao)
+
+    def previsao(self, versao, frame, parametros, unidades):
+        """Previsão de demanda da versão ``versao`` do cadastro, com o consumo atualizado até agora."""
+        consumo = self.motor_consumo(unidades); consumo.atualizar()
+        return self.motor_previsao().calcular(frame, versao, consumo, consumo.referencia, parametros, unidades)
@@ -0,0 +1,125 @@
+"""Montagem de carga Central -> hospitais, em lote.
+
+A carga inteira é validada contra o estoque do Central de uma vez e os
+movimentos são aplicados como uma atualização agrupada por produto/coluna.
+Cada linha da carga tem um id, então remover itens é O(1) por item. O
+destino de cada linha é resolvido no ``RegistroUnidades``.
+"""
+import numpy as np
+import pandas as pd
+
+from .esquema import atribuir
+from .indice import IndiceProdutos
+from .log import nova_linha
+from .metricas import medido
+from .unidades import REGISTRO_PADRAO
+
+
+def _hospital(destino, unidades):
+    u = unidades.resolver(destino)
+    if u is None or u.central: raise ValueError(f"Destino desconhecido: {destino}")
+    return u
+
+
+def coluna_destino(destino, unidades=REGISTRO_PADRAO):
+    return _hospital(destino, unidades).coluna_estoque
+
+
+def coluna_minimo(destino, unidades=REGISTRO_PADRAO):
+    return _hospital(destino, unidades).coluna_minimo
+
+
+def sugestao_transferencia(df_db, destino, necessidade=None, unidades=REGISTRO_PADRAO):
+    """Produto, Central, estoque e meta da loja, Sugestao e ➡️ Enviar limitado ao Central.
+
+    A Sugestao é meta - estoque, ou ``necessidade`` (Series por rótulo, ex.: da previsão de demanda) se informada.
+    """
+    col_central = unidades.central.coluna_estoque
+    col_est, col_min = coluna_destino(destino, unidades), coluna_minimo(destino, unidades)
+    df = df_db[['Produto', col_central, col_est, col_min]]
+    if necessidade is not None: falta = necessidade.reindex(df.index).fillna(0).clip(lower=0)
+    else: falta = (df[col_min].fillna(0) - df[col_est].fillna(0)).clip(lower=0)
+    df['Sugestao'] = np.trunc(falta).astype("int64")
+    df['➡️ Enviar'] = np.minimum(df['Sugestao'], df[col_central].fillna(0).clip(lower=0)).astype("int64")
+    return df
+
+
+class Carga:
+    """Itens acumulados da carga, indexados por id de linha."""
+
+    def __init__(self):
+        self.itens = {}
+        self._proximo = 1
+
+    def __len__(self):
+        return len(self.itens)
+
+    def adicionar(self, linhas):
+        ids = []
+        for l in linhas:
+            self.itens[self._proximo] = {"Destino": l["Destino"], "Produto": l["Produto"], "Quantidade": int(l["Quantidade"])}
+            ids.append(self._proximo); self._proximo += 1
+        return ids
+
+    def remover(self, ids):
+        return [self.itens.pop(i) for i in ids if i in self.itens]
+
+    def linhas(self):
+        return list(self.itens.values())
+
+    def frame(self):
+        return pd.DataFrame(self.linhas(), columns=["Destino", "Produto", "Quantidade"])
+
+
+def _rotular(df_db, linhas, indice):
+    if indice is None: indice = IndiceProdutos(df_db)
+    d = pd.DataFrame(linhas, columns=["Destino", "Produto", "Quantidade"])
+    d["Quantidade"] = pd.to_numeric(d["Quantidade"], errors="coerce").fillna(0).astype("int64")
+    d["_rot"] = indice.rotulos_por_nome(d["Produto"])
+    return d
+
+
+@medido()
+def validar_carga(df_db, linhas, indice=None, unidades=REGISTRO_PADRAO):
+    """Produtos em que a carga pede mais do que há no Central (Produto, Pedido, Saldo). Vazio = ok."""
+    d = _rotular(df_db, linhas, indice)
+    sem_cadastro = d[d["_rot"].isna()]
+    pedido = d.dropna(subset=["_rot"]).groupby("_rot").agg(Produto=("Produto", "first"), Pedido=("Quantidade", "sum"))
+    pedido["Saldo"] = df_db.loc[pedido.index.astype("int64"), unidades.central.coluna_estoque].fillna(0).to_numpy()
+    faltas = pedido[pedido["Pedido"] > pedido["Saldo"]]
+    if not sem_cadastro.empty:
+        faltas = pd.concat([faltas, pd.DataFrame({"Produto": sem_cadastro["Produto"], "Pedido": sem_cadastro["Quantidade"], "Saldo": 0})])
+    return faltas.reset_index(drop=True)
+
+
+@medido()
+def aplicar_carga(df_db, linhas, indice=None, sinal=1, unidades=REGISTRO_PADRAO):
+    """Move as quantidades Central -> destino (``sinal=-1`` estorna). Altera ``df_db`` no lugar."""
+    d = _rotular(df_db, linhas, indice).dropna(subset=["_rot"])
+    if d.empty: return df_db
+    d["_rot"] = d["_rot"].astype("int64")
+    d["_col"] = d["Destino"].map({dest: coluna_destino(dest, unidades) for dest in d["Destino"].unique()})
+    col_central = unidades.central.coluna_estoque
+    central = d.groupby("_rot")["Quantidade"].sum()
+    atribuir(df_db, central.index, col_central, df_db.loc[central.index, col_central].fillna(0) - sinal * central)
+    for col, g in d.groupby("_col"):
+        q = g.groupby("_rot")["Quantidade"].sum()
+        atribuir(df_db, q.index, col, df_db.loc[q.index, col].fillna(0) + sinal * q)
+    return df_db
+
+
+def transferir(df_db, linhas, indice=None, unidades=REGISTRO_PADRAO):
+    """Valida e, se o Central tiver saldo para tudo, aplica a carga. Devolve (df, faltas).
+
+    Para usar como operação de ``gravar_com_repeticao``: a cada tentativa a validação
+    é refeita sobre o saldo relido.
+    """
+    faltas = validar_carga(df_db, linhas, indice, unidades)
+    if faltas.empty: aplicar_carga(df_db, linhas, indice, unidades=unidades)
+    return df_db, faltas
+
+
+def linhas_log(linhas, estorno=False, usuario="Sistema", unidades=REGISTRO_PADRAO):
+    central = unidades.central.rotulo
+    if estorno: return [nova_linha(l["Produto"], l["Quantidade"], "Estorno", f"{l['Destino']} -> {central}", usuario) for l in linhas]
+    return [nova_linha(l["Produto"], l["Quantidade"], "Transferência", f"{central} -> {l['Destino']}", usuario) for l in linhas]
@@ -0,0 +1,130 @@
+"""Cadastro das unidades (Central e hospitais).
+
+Cada unidade tem um código curto que dá nome às colunas da visão larga do
+cadastro (``Estoque_<codigo>`` e, nos hospitais, ``Min_<codigo>``) e uma lista
+de palavras que a identificam em textos livres (detalhes do log, colunas de
+planilha, a coluna ``Loja`` do ``estoque_completo.csv``). Acrescentar um
+hospital é acrescentar uma ``Unidade`` ao registro; nenhum código testa nome
+de unidade.
+"""
+import os
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+COLUNAS_UNIDADE = ["codigo", "nome", "central", "palavras", "curto"]
+
+
+@dataclass(frozen=True)
+class Unidade:
+    codigo: str
+    nome: str
+    central: bool = False
+    palavras: tuple = ()
+    curto: str = ""
+
+    @property
+    def coluna_estoque(self):
+        return f"Estoque_{self.codigo}"
+
+    @property
+    def coluna_minimo(self):
+        return f"Min_{self.codigo}"
+
+    @property
+    def rotulo(self):
+        return self.curto or self.nome
+
+
+def nova_unidade(codigo, nome, palavras="", curto=""):
+    """Unidade (hospital) a partir dos campos do formulário; ``palavras`` separadas por vírgula."""
+    codigo, nome = str(codigo).strip(), str(nome).strip()
+    if not codigo.isidentifier() or not nome: raise ValueError("Informe código (letras/números, sem espaço) e nome.")
+    return Unidade(codigo, nome, False, tuple(p.strip().lower() for p in str(palavras).split(",") if p.strip()), str(curto).strip())
+
+
+PADRAO = (
+    Unidade("Central", "Depósito Geral (Central)", True, ("central",), "Central"),
+    Unidade("SA", "Hospital Santo Amaro", False, ("amaro",), "Sto Amaro"),
+    Unidade("SI", "Hospital Santa Izabel", False, ("izabel",), "Sta Izabel"),
+)
+
+
+@dataclass(frozen=True)
+class RegistroUnidades:
+    unidades: tuple = field(default=PADRAO)
+
+    def __iter__(self):
+        return iter(self.unidades)
+
+    def __len__(self):
+        return len(self.unidades)
+
+    @property
+    def central(self):
+        return next(u for u in self.unidades if u.central)
+
+    @property
+    def destinos(self):
+        """Unidades que recebem do Central (os hospitais)."""
+        return [u for u in self.unidades if not u.central]
+
+    def por_codigo(self, codigo):
+        return next((u for u in self.unidades if u.codigo == codigo), None)
+
+    def resolver(self, texto):
+        """Unidade citada em ``texto`` (nome, código ou palavra-chave), ou None."""
+        t = str(texto).strip().casefold()
+        exata = next((u for u in self.unidades if t in (u.nome.casefold(), u.codigo.casefold())), None)
+        return exata or next((u for u in self.unidades if any(p.casefold() in t for p in u.palavras)), None)
+
+    def nome(self, texto):
+        """Nome oficial da unidade citada em ``texto``; texto sem unidade conhecida volta como está."""
+        u = self.resolver(texto)
+        return u.nome if u else str(texto).strip()
+
+    def colunas_estoque(self):
+        return [u.coluna_estoque for u in self.unidades]
+
+    def colunas_minimo(self):
+        return [u.coluna_minimo for u in self.destinos]
+
+    def colunas_saldo(self):
+        return self.colunas_minimo() + self.colunas_estoque()
+
+    def adicionar(self, unidade):
+        if self.por_codigo(unidade.codigo): raise ValueError(f"Unidade já cadastrada: {unidade.codigo}")
+        return RegistroUnidades(self.unidades + (unidade,))
+
+    # --- TABELA (SQLite / CSV) ---
+    def frame(self):
+        return pd.DataFrame([(u.codigo, u.nome, int(u.central), ";".join(u.palavras), u.curto) for u in self.unidades], columns=COLUNAS_UNIDADE)
+
+    @classmethod
+    def de_frame(cls, df):
+        if df.empty: return cls()
+        return cls(tuple(Unidade(str(r.codigo), str(r.nome), bool(int(r.central)), tuple(p for p in str(r.palavras or "").split(";") if p), str(r.curto or ""))
+                         for r in df.itertuples()))
+
+
+REGISTRO_PADRAO = RegistroUnidades()
+
+
+def colunas_estoque(colunas):
+    """Colunas ``Estoque_*`` de um cadastro largo, de qualquer unidade."""
+    return [c for c in colunas if str(c).startswith("Estoque_")]
+
+
+def colunas_minimo(colunas):
+    return [c for c in colunas if str(c).startswith("Min_")]
+
+
+def ler_registro_csv(caminho):
+    if not os.path.exists(caminho): return REGISTRO_PADRAO
+    return RegistroUnidades.de_frame(pd.read_csv(caminho, dtype=str, keep_default_na=False))
+
+
+def gravar_registro_csv(registro, caminho):
+    tmp = caminho + ".tmp"
+    registro.frame().to_csv(tmp, index=False)
+    os.replace(tmp, caminho)
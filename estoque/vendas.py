@@ -0,0 +1,186 @@
+"""Consumo por produto e unidade, derivado das contagens e das transferências.
+
+Entre duas contagens de um produto numa unidade, o consumo é
+``saldo anterior + transferências recebidas - saldo contado`` (negativo vira
+zero: entrada que não passou pelo sistema). O consumo é lançado na semana da
+contagem que fecha o período, junto com a ``Cobertura`` (duração do período
+em semanas), de modo que ``Consumo / Cobertura`` é a taxa semanal mesmo com
+contagens espaçadas; as transferências líquidas vão para a semana em que
+aconteceram.
+
+``MotorConsumo`` lê do ``IndiceHistorico`` só os eventos novos desde a última
+atualização e soma nos agregados das semanas afetadas; as semanas antigas não
+são recalculadas. Os eventos são processados na ordem do log.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .log import FORMATO_DATA
+from .unidades import REGISTRO_PADRAO
+
+TIPOS_MOVIMENTO = ("Transferência", "Estorno")
+TIPO_CONTAGEM = "Contagem"
+SEMANAS_MEDIA = 4
+CHAVE = ["Produto", "Unidade"]
+SEGUNDOS_SEMANA = 7 * 24 * 3600
+
+
+def semana(datas):
+    """Segunda-feira da semana de cada data."""
+    return (datas - pd.to_timedelta(datas.dt.dayofweek, unit="D")).dt.normalize()
+
+
+def carregar_referencia(caminho, unidades=REGISTRO_PADRAO):
+    """``estoque_completo.csv``: média de vendas semanal e estoque por (Produto, Unidade)."""
+    try: ref = pd.read_csv(caminho)
+    except (OSError, pd.errors.EmptyDataError): return pd.DataFrame(columns=["Media_Vendas_Semana", "Estoque_Atual"])
+    ref["Unidade"] = _por_valor(ref["Loja"], unidades.nome)
+    return ref.groupby(CHAVE)[["Media_Vendas_Semana", "Estoque_Atual"]].last()
+
+
+def _por_valor(serie, funcao):
+    """``funcao`` aplicada uma vez por valor distinto (os textos de destino se repetem muito)."""
+    codigos, valores = pd.factorize(serie)
+    return np.asarray([funcao(v) for v in valores] + [None], dtype=object)[codigos]
+
+
+def _eventos(ev, unidades=REGISTRO_PADRAO):
+    """Log -> linhas (Produto, Unidade, Data, q, contagem). Transferência vira saída na origem e entrada no destino."""
+    ev = ev.assign(Data=pd.to_datetime(ev["Data"], format=FORMATO_DATA, errors="coerce"),
+                   Quantidade=pd.to_numeric(ev["Quantidade"], errors="coerce").fillna(0)).dropna(subset=["Data"])
+    def _origem(detalhe): return unidades.nome(detalhe.split("->", 1)[0])
+    def _destino(detalhe): return unidades.nome(detalhe.split("->", 1)[1]) if "->" in detalhe else None
+    mov = ev[ev["Tipo"].isin(TIPOS_MOVIMENTO)]
+    destino = _por_valor(mov["Detalhe"].astype(str), _destino)
+    mov, destino = mov[destino != None], destino[destino != None]  # noqa: E711
+    cont = ev[ev["Tipo"] == TIPO_CONTAGEM]
+    def bloco(d, unidades, q, contagem):
+        return pd.DataFrame({"Produto": d["Produto"].to_numpy(), "Unidade": unidades, "Data": d["Data"].to_numpy(), "q": q, "contagem": contagem})
+    return pd.concat([
+        bloco(mov, destino, mov["Quantidade"].to_numpy(), False),
+        bloco(mov, _por_valor(mov["Detalhe"].astype(str), _origem), -mov["Quantidade"].to_numpy(), False),
+        bloco(cont, _por_valor(cont["Detalhe"], unidades.nome), cont["Quantidade"].to_numpy(), True),
+    ], ignore_index=True)
+
+
+class MotorConsumo:
+    def __init__(self, historico, referencia=None, unidades=REGISTRO_PADRAO):
+        self.historico = historico
+        self.unidades = unidades
+        self.referencia = referencia if referencia is not None else pd.DataFrame(columns=["Media_Vendas_Semana", "Estoque_Atual"])
+        self.cursor = {}
+        # por (Produto, Unidade): saldo da última contagem, data dela e transferências líquidas desde então
+        self._estado = pd.DataFrame({"Saldo": pd.Series(dtype=float), "Data": pd.Series(dtype="datetime64[ns]"), "Pendente": pd.Series(dtype=float)},
+                                    index=pd.MultiIndex.from_arrays([[], []], names=CHAVE))
+        self._semanas = {}   # semana -> DataFrame (Produto, Unidade) x [Entradas, Consumo]
+        self._memo = {}
+        self.versao = 0
+        self._trava = threading.Lock()
+
+    # --- ATUALIZAÇÃO ---
+    def atualizar(self):
+        """Processa os eventos novos do log. Retorna quantos foram lidos."""
+        with self._trava:
+            ev, cursor = self.historico.eventos_desde(self.cursor, TIPOS_MOVIMENTO + (TIPO_CONTAGEM,))
+            self.cursor = cursor
+            if ev.empty: return 0
+            self._processar(_eventos(ev, self.unidades))
+            self.versao += 1; self._memo = {}
+            return len(ev)
+
+    def _processar(self, d):
+        if d.empty: return
+        d = d.sort_values(CHAVE + ["Data", "contagem"], kind="stable").reset_index(drop=True)
+        g = d.groupby(CHAVE, sort=False)
+        # período de cada linha: nº de contagens antes dela no grupo; a contagem fecha o período em que cai
+        d["periodo"] = g["contagem"].cumsum() - d["contagem"]
+        d["semana"] = semana(d["Data"])
+
+        mov = d[~d["contagem"]]
+        entradas = mov.groupby(CHAVE + ["periodo"])["q"].sum()
+        cont = d[d["contagem"]]
+        if not cont.empty:
+            est = self._estado.reindex(pd.MultiIndex.from_frame(cont[CHAVE]))
+            anterior = cont.groupby(CHAVE, sort=False)["q"].shift(1).to_numpy()
+            primeira = cont["periodo"].to_numpy() == 0
+            abertura = np.where(primeira, est["Saldo"].to_numpy(), anterior)
+            recebido = entradas.reindex(pd.MultiIndex.from_frame(cont[CHAVE + ["periodo"]])).fillna(0).to_numpy()
+            recebido = recebido + np.where(primeira, est["Pendente"].fillna(0).to_numpy(), 0)
+            cont["Consumo"] = np.clip(abertura + recebido - cont["q"].to_numpy(), 0, None)
+            inicio = cont.groupby(CHAVE, sort=False)["Data"].shift(1).where(~primeira, est["Data"].to_numpy())
+            cont["Cobertura"] = ((cont["Data"] - inicio).dt.total_seconds() / SEGUNDOS_SEMANA).where(cont["Consumo"].notna())
+        else:
+            cont["Consumo"] = cont["Cobertura"] = pd.Series(dtype=float)
+
+        # agregados das semanas afetadas
+        novo = pd.concat([mov.groupby(["semana"] + CHAVE)["q"].sum().rename("Entradas"),
+                          cont.dropna(subset=["Consumo"]).groupby(["semana"] + CHAVE)[["Consumo", "Cobertura"]].sum()], axis=1).fillna(0)
+        for sem, parte in novo.groupby(level=0):
+            parte = parte.droplevel(0)
+            atual = self._semanas.get(sem)
+            self._semanas[sem] = parte if atual is None else atual.add(parte, fill_value=0)
+
+        # estado por (Produto, Unidade) para o próximo lote: movimentos depois da última contagem ficam pendentes
+        n = g["contagem"].sum()
+        n_mov = n.reindex(pd.MultiIndex.from_frame(mov[CHAVE])).to_numpy()
+        apos = mov[mov["periodo"].to_numpy() == n_mov].groupby(CHAVE)["q"].sum().reindex(n.index).fillna(0)
+        ant = self._estado.reindex(n.index)
+        ultimos = cont.groupby(CHAVE)[["q", "Data"]].last().reindex(n.index)
+        contou = (n > 0).to_numpy()
+        novo_estado = pd.DataFrame({
+            "Saldo": np.where(contou, ultimos["q"], ant["Saldo"]),
+            "Data": ultimos["Data"].where(contou, ant["Data"]),
+            "Pendente": apos + np.where(contou, 0, ant["Pendente"].fillna(0)),
+        }, index=n.index)
+        self._estado = pd.concat([self._estado[~self._estado.index.isin(n.index)], novo_estado])
+
+    # --- CONSULTA (memorizada até a próxima atualização) ---
+    def _memorizado(self, chave, funcao):
+        if chave not in self._memo: self._memo[chave] = funcao()
+        return self._memo[chave]
+
+    def semanal(self, produto=None, unidade=None):
+        """Série semanal (Semana, Unidade, Entradas, Consumo), somada sobre os produtos se ``produto`` for None."""
+        def calc():
+            partes = []
+            for sem, df in sorted(self._semanas.items()):
+                if produto is not None: df = df[df.index.get_level_values("Produto") == produto]
+                if unidade is not None: df = df[df.index.get_level_values("Unidade") == unidade]
+                if len(df): partes.append(df.groupby(level="Unidade").sum().assign(Semana=sem))
+            if not partes: return pd.DataFrame(columns=["Semana", "Unidade", "Entradas", "Consumo"])
+            return pd.concat(partes).reset_index()[["Semana", "Unidade", "Entradas", "Consumo"]]
+        with self._trava: return self._memorizado(("semanal", produto, unidade), calc)
+
+    def resumo(self, semanas=SEMANAS_MEDIA):
+        """Por (Produto, Unidade): consumo semanal das últimas ``semanas`` semanas, última contagem e a média de referência."""
+        def calc():
+            ultimas = sorted(self._semanas)[-semanas:]
+            if ultimas:
+                soma = pd.concat([self._semanas[s] for s in ultimas]).groupby(level=CHAVE).sum()
+                media = (soma["Consumo"] / soma["Cobertura"].where(soma["Cobertura"] > 0)).rename("Consumo_Semana")
+            else: media = pd.Series(dtype=float, name="Consumo_Semana")
+            est = self._estado[["Saldo", "Data"]].rename(columns={"Saldo": "Ultima_Contagem", "Data": "Data_Contagem"})
+            idx = media.index.union(est.index).union(self.referencia.index)
+            out = pd.concat([media.reindex(idx), est.reindex(idx), self.referencia["Media_Vendas_Semana"].reindex(idx)], axis=1)
+            return out.rename_axis(CHAVE).reset_index()
+        with self._trava: return self._memorizado(("resumo", semanas), calc)
+
+    def matriz(self, semanas):
+        """(consumo, cobertura) das ``semanas`` semanas de calendário até a última com dados.
+
+        DataFrames (Produto, Unidade) x Semana; semana sem contagem fechada fica NaN.
+        """
+        def calc():
+            if not self._semanas:
+                vazio = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=CHAVE))
+                return vazio, vazio
+            fim = max(self._semanas)
+            calendario = pd.date_range(end=fim, periods=semanas, freq="7D")
+            partes = {s: self._semanas[s][["Consumo", "Cobertura"]] for s in calendario if s in self._semanas}
+            d = pd.concat(partes, names=["Semana"])
+            d = d[d["Cobertura"] > 0]
+            consumo = d["Consumo"].unstack("Semana").reindex(columns=calendario)
+            return consumo, d["Cobertura"].unstack("Semana").reindex(columns=calendario)
+        with self._trava: return self._memorizado(("matriz", semanas), calc)
@@ -1,30 +1,38 @@
 import streamlit as st
 import pandas as pd
-import os
-from datetime import datetime
-from fpdf import FPDF
-import io
+from estoque.busca import IndiceBusca
+from estoque.compras import itens_pedido, totais_pedido
+from estoque.concorrencia import ConflitoGravacao
+from estoque.esquema import relatorio_memoria
+from estoque.exportacao import chave_documento
+from estoque.importacao import importar_cadastro, importar_contagem_em_blocos, linhas_contagem
+from estoque.indice import IndiceProdutos
+from estoque.metricas import METRICAS
+from estoque.planilhas import PlanilhaContagem
+from estoque.previsao import ParametrosPrevisao, sugestao_por_unidade
+from estoque.sistema import Configuracao, Sistema
+from estoque.transferencia import Carga, aplicar_carga, coluna_destino, coluna_minimo, linhas_log, sugestao_transferencia, transferir
+from estoque.unidades import nova_unidade
+from estoque.vendas import SEMANAS_MEDIA
+from datetime import date, timedelta
+# fpdf (documentos) e plotly são importados só pelas telas que usam; openpyxl, pelo pandas ao ler/gravar xlsx
 
 # --- CONFIGURAÇÃO ---
 st.set_page_config(page_title="Sistema Gestão 36.2 (Estável)", layout="wide", initial_sidebar_state="collapsed")
-ARQUIVO_DADOS = "banco_dados.csv"
-ARQUIVO_LOG = "historico_log.csv"
-UNIDADES = ["📊 Dashboard", "Estoque Central", "Hosp. Santo Amaro", "Hosp. Santa Izabel", "🛒 Compras", "📜 Histórico"]
 
 # --- INICIALIZAÇÃO DE ESTADO (BLINDADA) ---
 def init_state():
     keys_defaults = {
-        'romaneio_pdf': None,
-        'romaneio_xlsx': None,
-        'pedido_pdf': None,
-        'pedido_xlsx': None,
+        'romaneio_job': None,
+        'pedido_job': None,
         'tela_atual': "Compras",
         'selecao_exclusao': [],
-        'carga_acumulada': [],
+        'carga_acumulada': Carga(),
         'transf_key_ver': 0,
         'transf_last_dest': "",
         'transf_df_cache': None,
-        'compras_df_cache': None,
+        'compras_sugerir': False,
+        'previsao_param': ParametrosPrevisao(),
         'compras_key_ver': 0,
         'last_forn': "Todos"
     }
@@ -35,120 +43,88 @@ def init_state():
 
 init_state()
 
+# --- SISTEMA (banco, cache, log e motores: um por processo, sem Streamlit; ver estoque.sistema) ---
+@st.cache_resource
+def sistema():
+    return Sistema(Configuracao.do_ambiente())
+
 # --- FUNÇÕES ---
-@st.cache_data
 def carregar_dados():
-    colunas = [
-        "Codigo", "Codigo_Unico", "Produto", "Produto_Alt", 
-        "Categoria", "Fornecedor", "Padrao", "Custo", 
-        "Min_SA", "Min_SI", 
-        "Estoque_Central", "Estoque_SA", "Estoque_SI"
-    ]
-    if not os.path.exists(ARQUIVO_DADOS):
-        df = pd.DataFrame(columns=colunas)
-        df.to_csv(ARQUIVO_DADOS, index=False)
-        return df
-    try: return pd.read_csv(ARQUIVO_DADOS)
-    except: return pd.DataFrame(columns=colunas)
-
-def salvar_banco(df):
-    df.to_csv(ARQUIVO_DADOS, index=False)
-    carregar_dados.clear()
-
-def limpar_numero(valor):
-    if pd.isna(valor): return 0.0
-    s = str(valor).lower().replace('r$', '').replace(' ', '').replace(',', '.')
-    try: return float(s)
-    except: return 0.0
+    # frame compartilhado entre as sessões; a cópia rasa deixa esta sessão alterar sem afetar as outras
+    versao, frame = sistema().obter()
+    st.session_state['dados_versao'], st.session_state['dados_base'] = versao, frame
+    return frame.copy(deep=False)
 
-def registrar_log(produto, quantidade, tipo, origem_destino, usuario="Sistema"):
-    novo = {"Data": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Produto": produto, "Quantidade": quantidade, "Tipo": tipo, "Detalhe": origem_destino, "Usuario": usuario}
-    if not os.path.exists(ARQUIVO_LOG): df = pd.DataFrame(columns=["Data", "Produto", "Quantidade", "Tipo", "Detalhe", "Usuario"])
-    else: df = pd.read_csv(ARQUIVO_LOG)
-    pd.concat([df, pd.DataFrame([novo])], ignore_index=True).to_csv(ARQUIVO_LOG, index=False)
+def versao_dados():
+    return st.session_state['dados_versao']
 
-# --- PDF ROMANEIO ---
-def criar_pdf_unificado(lista_carga):
-    try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(190, 10, txt="ROMANEIO DE ENTREGA UNIFICADO", ln=True, align='C')
-        pdf.set_font("Arial", size=10)
-        pdf.cell(190, 10, txt=f"Data Emissao: {datetime.now().strftime('%d/%m/%Y %H:%M')}", ln=True, align='C')
-        pdf.ln(10)
-        
-        df = pd.DataFrame(lista_carga)
-        df_pivot = df.pivot_table(index='Produto', columns='Destino', values='Quantidade', aggfunc='sum', fill_value=0).reset_index()
-        
-        col_sa = "Hospital Santo Amaro"; col_si = "Hospital Santa Izabel"
-        if col_sa not in df_pivot.columns: df_pivot[col_sa] = 0
-        if col_si not in df_pivot.columns: df_pivot[col_si] = 0
-        
-        pdf.set_fill_color(200, 220, 255); pdf.set_font("Arial", 'B', 10)
-        pdf.cell(110, 10, "Produto", 1, 0, 'C', fill=True)
-        pdf.cell(40, 10, "Qtd Sto Amaro", 1, 0, 'C', fill=True)
-        pdf.cell(40, 10, "Qtd Sta Izabel", 1, 1, 'C', fill=True)
-        
-        pdf.set_font("Arial", size=10)
-        for index, row in df_pivot.iterrows():
-            prod = str(row['Produto']).encode('latin-1', 'replace').decode('latin-1')[:55]
-            qtd_sa = str(int(row[col_sa])) if row[col_sa] > 0 else "-"
-            qtd_si = str(int(row[col_si])) if row[col_si] > 0 else "-"
-            pdf.cell(110, 8, prod, 1, 0, 'L')
-            pdf.cell(40, 8, qtd_sa, 1, 0, 'C')
-            pdf.cell(40, 8, qtd_si, 1, 1, 'C')
-        
-        pdf.ln(20)
-        pdf.cell(60, 10, "_"*30, 0, 0, 'C'); pdf.cell(5, 10, "", 0, 0); pdf.cell(60, 10, "_"*30, 0, 0, 'C'); pdf.cell(5, 10, "", 0, 0); pdf.cell(60, 10, "_"*30, 0, 1, 'C')
-        pdf.set_font("Arial", size=8)
-        pdf.cell(60, 5, "Expedicao (Central)", 0, 0, 'C'); pdf.cell(5, 5, "", 0, 0); pdf.cell(60, 5, "Recebedor (Sto Amaro)", 0, 0, 'C'); pdf.cell(5, 5, "", 0, 0); pdf.cell(60, 5, "Recebedor (Sta Izabel)", 0, 1, 'C')
-        return pdf.output(dest='S').encode('latin-1', 'replace')
-    except Exception as e: return str(e).encode('utf-8')
-
-# --- PDF PEDIDO ---
-def criar_pdf_pedido(dataframe, fornecedor, total):
-    try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(190, 10, txt=f"PEDIDO DE COMPRA - {fornecedor.upper()}", ln=True, align='C')
-        pdf.set_font("Arial", size=10)
-        pdf.cell(190, 10, txt=f"Data: {datetime.now().strftime('%d/%m/%Y')}", ln=True, align='C')
-        pdf.ln(10)
-        
-        pdf.set_fill_color(230, 230, 230); pdf.set_font("Arial", 'B', 9)
-        pdf.cell(90, 8, "Produto", 1, 0, 'C', fill=True)
-        pdf.cell(30, 8, "Padrao", 1, 0, 'C', fill=True)
-        pdf.cell(20, 8, "Qtd", 1, 0, 'C', fill=True)
-        pdf.cell(25, 8, "Custo", 1, 0, 'C', fill=True)
-        pdf.cell(25, 8, "Total", 1, 1, 'C', fill=True)
-        
-        pdf.set_font("Arial", size=9)
-        for i, r in dataframe.iterrows():
-            p = str(r['Produto'])[:45].encode('latin-1','replace').decode('latin-1')
-            e = str(r.get('Padrao','-')).encode('latin-1','replace').decode('latin-1')
-            q = int(r['Qtd Compra'])
-            c = float(r['Custo'])
-            t = float(r['Total Item'])
-            
-            pdf.cell(90, 8, p, 1, 0, 'L')
-            pdf.cell(30, 8, e, 1, 0, 'C')
-            pdf.cell(20, 8, str(q), 1, 0, 'C')
-            pdf.cell(25, 8, f"R$ {c:.2f}", 1, 0, 'R')
-            pdf.cell(25, 8, f"R$ {t:.2f}", 1, 1, 'R')
-        
-        pdf.ln(5); pdf.set_font("Arial", 'B', 12)
-        pdf.cell(190, 10, txt=f"TOTAL GERAL: R$ {total:,.2f}", ln=True, align='R')
-        return pdf.output(dest='S').encode('latin-1', 'replace')
-    except Exception as e: return str(e).encode('utf-8')
+def derivado(chave, funcao):
+    return sistema().derivado(versao_dados(), st.session_state['dados_base'], chave, funcao)
+
+def carregar_indice():
+    return derivado("indice", IndiceProdutos)
 
+def indice_busca():
+    return derivado("busca", IndiceBusca)
+
+def unidades():
+    return sistema().unidades(versao_dados(), st.session_state['dados_base'])
+
+def previsao_atual():
+    return sistema().previsao(versao_dados(), st.session_state['dados_base'], st.session_state['previsao_param'], unidades())
+
+def gravar(operacao):
+    # ``operacao(df)`` devolve (df a gravar, resultado). Roda sobre o cadastro mais recente e, se outra
+    # sessão gravar as mesmas células no meio do caminho, é refeita sobre os valores novos (ver estoque.concorrencia).
+    # Dentro dela, carregar_indice()/unidades() já enxergam a versão relida.
+    def sobre(df, versao, base):
+        st.session_state['dados_versao'], st.session_state['dados_base'] = versao, base
+        return operacao(df)
+    try: return sistema().gravar(sobre)
+    except ConflitoGravacao as e:
+        st.error(f"Não gravado: {e}. Tente de novo."); st.dataframe(e.conflitos, use_container_width=True); st.stop()
+
+def registrar_log(produto, quantidade, tipo, origem_destino, usuario="Sistema"):
+    sistema().registrar_log(produto, quantidade, tipo, origem_destino, usuario)
+
+def registrar_logs(linhas):
+    return sistema().registrar_logs(linhas)
+
+# --- EXPORTAÇÕES EM SEGUNDO PLANO ---
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def exportar(chave, pdf, xlsx):
+    """Enfileira PDF e XLSX do documento ``chave`` (cada um como (função, args)). Já pronto ou em andamento: nada a fazer."""
+    return sistema().fila_exportacao().submeter(chave, {"pdf": ("pdf",) + pdf, "xlsx": ("xlsx",) + xlsx})[0]
+
+@st.fragment(run_every=1)
+def acompanhar_exportacao(chave):
+    trabalho = sistema().fila_exportacao().trabalho(chave)
+    if trabalho is None or trabalho.concluido: st.rerun()
+    estado = trabalho.estado()
+    st.progress(trabalho.progresso, text=f"Gerando... PDF: {estado['pdf']} | Excel: {estado['xlsx']}")
+
+def botoes_exportacao(chave, nome, col_pdf, col_xlsx, rotulos=("⬇️ Baixar PDF", "⬇️ Baixar Excel")):
+    """Progresso enquanto o trabalho roda; botões de download quando termina. True se os arquivos estão prontos."""
+    trabalho = sistema().fila_exportacao().trabalho(chave)
+    if trabalho is None: return False
+    if not trabalho.concluido:
+        with col_pdf: acompanhar_exportacao(chave)
+        return False
+    if trabalho.falhou:
+        st.error("Erro ao gerar arquivos."); return False
+    try:
+        with open(trabalho.arquivo("pdf"), "rb") as f: col_pdf.download_button(rotulos[0], f.read(), f"{nome}.pdf", "application/pdf")
+        with open(trabalho.arquivo("xlsx"), "rb") as f: col_xlsx.download_button(rotulos[1], f.read(), f"{nome}.xlsx", XLSX_MIME)
+    except OSError:
+        return False  # removido do cache: gerar de novo
+    return True
 
 # --- MENU SUPERIOR ---
 st.markdown("<h2 style='text-align: center; color: #2E86C1;'>Sistema de Gestão Hospitalar</h2>", unsafe_allow_html=True)
 st.markdown("---")
 
-c1, c2, c3, c4, c5, c6 = st.columns(6)
+c1, c2, c3, c4, c5, c6, c7 = st.columns(7)
 
 def botao(col, txt, ico, nome_t):
     estilo = "primary" if st.session_state.get('tela_atual') == nome_t else "secondary"
@@ -162,16 +138,15 @@ botao(c3, "Compras", "🛒", "Compras")
 botao(c4, "Produtos", "📋", "Produtos")
 botao(c5, "Vendas", "📉", "Vendas")
 botao(c6, "Sugestões", "💡", "Sugestoes")
+botao(c7, "Histórico", "📜", "Historico")
 
 st.markdown("---")
 
-tela = st.session_state.get('tela_atual', "Estoque")
-df_db = carregar_dados()
-
 # =================================================================================
 # 🛒 TELA DE COMPRAS
 # =================================================================================
-if tela == "Compras":
+def tela_compras():
+    df_db = carregar_dados()
     st.header("🛒 Gestão de Compras")
     
     col_forn, col_vazio = st.columns([1, 2])
@@ -179,43 +154,34 @@ if tela == "Compras":
     forn_sel = col_forn.selectbox("Filtrar por Fornecedor:", lista_fornecedores)
     
     if forn_sel != st.session_state.get('last_forn'):
-        st.session_state['compras_df_cache'] = None
+        st.session_state['compras_sugerir'] = False
         st.session_state['compras_key_ver'] = st.session_state.get('compras_key_ver', 0) + 1
         st.session_state['last_forn'] = forn_sel
-        st.session_state['pedido_pdf'] = None
-        st.session_state['pedido_xlsx'] = None
+        st.session_state['pedido_job'] = None
 
     st.divider()
 
-    if st.button("🪄 Calcular Sugestão (Meta - Estoque Total)"):
-        if forn_sel == "Todos": df_calc = df_db.copy()
-        else: df_calc = df_db[df_db['Fornecedor'] == forn_sel].copy()
-            
-        df_calc['Meta Global'] = df_calc['Min_SA'] + df_calc['Min_SI']
-        df_calc['Estoque Total'] = df_calc['Estoque_Central'] + df_calc['Estoque_SA'] + df_calc['Estoque_SI']
-        df_calc['Qtd Compra'] = (df_calc['Meta Global'] - df_calc['Estoque Total']).apply(lambda x: max(0, int(x)))
-        
-        st.session_state['compras_df_cache'] = df_calc
+    base_compra = st.radio("Base da Sugestão:", ["Meta - Estoque Total", "Previsão de Demanda"], horizontal=True, key="compras_base")
+    if st.button(f"🪄 Calcular Sugestão ({base_compra})"):
+        st.session_state['compras_sugerir'] = True
         st.session_state['compras_key_ver'] += 1
         st.success("Sugestão calculada!")
         st.rerun()
 
-    if st.session_state.get('compras_df_cache') is not None:
-        df_view = st.session_state['compras_df_cache'].copy()
-    else:
-        if forn_sel == "Todos": df_view = df_db.copy()
-        else: df_view = df_db[df_db['Fornecedor'] == forn_sel].copy()
-        df_view['Meta Global'] = df_view['Min_SA'] + df_view['Min_SI']
-        df_view['Estoque Total'] = df_view['Estoque_Central'] + df_view['Estoque_SA'] + df_view['Estoque_SI']
-        df_view['Qtd Compra'] = 0
+    # cálculo compartilhado entre as sessões, refeito só quando o banco muda de versão
+    motor = sistema().motor_compras(); motor.sincronizar(df_db, versao_dados())
+    _, df_view = motor.sugestao(forn_sel)
 
     busca_compra = st.text_input("🔍 Buscar Produto na Lista:", "")
-    if busca_compra: df_view = df_view[df_view['Produto'].str.contains(busca_compra, case=False, na=False)]
+    if busca_compra: df_view = indice_busca().filtrar(df_view, busca_compra)
 
-    df_view['Valor Total'] = df_view['Qtd Compra'] * df_view['Custo']
+    df_view = df_view[['Produto', 'Fornecedor', 'Padrao', 'Estoque Total', 'Meta Global', 'Custo', 'Qtd Compra']]
+    if not st.session_state.get('compras_sugerir'): df_view = df_view.assign(**{'Qtd Compra': 0})
+    elif base_compra == "Previsão de Demanda":
+        df_view = df_view.assign(**{'Qtd Compra': sugestao_por_unidade(previsao_atual(), unidades().central.nome).reindex(df_view.index).fillna(0).astype("int64")})
 
     edited_df = st.data_editor(
-        df_view[['Produto', 'Fornecedor', 'Padrao', 'Estoque Total', 'Meta Global', 'Custo', 'Qtd Compra']],
+        df_view,
         column_config={
             "Produto": st.column_config.TextColumn(disabled=True),
             "Fornecedor": st.column_config.TextColumn(disabled=True),
@@ -228,11 +194,10 @@ if tela == "Compras":
         use_container_width=True,
         hide_index=True,
         height=500,
-        key=f"editor_compras_{st.session_state.get('compras_key_ver', 0)}"
+        key=f"editor_compras_{st.session_state.get('compras_key_ver', 0)}_{base_compra}"
     )
     
-    total_itens = int(edited_df['Qtd Compra'].sum())
-    total_valor = (edited_df['Qtd Compra'] * edited_df['Custo']).sum()
+    total_itens, total_valor = totais_pedido(edited_df)
     
     st.divider()
     c_tot1, c_tot2 = st.columns(2)
@@ -242,66 +207,60 @@ if tela == "Compras":
     c_act1, c_act2, c_act3 = st.columns(3)
     
     if c_act1.button("📄 Gerar Pedido (Processar)", type="primary"):
-        itens_compra = edited_df[edited_df['Qtd Compra'] > 0].copy()
-        itens_compra['Total Item'] = itens_compra['Qtd Compra'] * itens_compra['Custo']
+        itens_compra = itens_pedido(edited_df)
         
         if itens_compra.empty:
             st.warning("Nenhum item para comprar.")
         else:
-            pdf_bytes = criar_pdf_pedido(itens_compra, forn_sel, total_valor)
-            st.session_state['pedido_pdf'] = pdf_bytes
-            
-            buf = io.BytesIO()
-            with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-                itens_compra.to_excel(writer, index=False, sheet_name='Pedido')
-            st.session_state['pedido_xlsx'] = buf.getvalue()
-            
-            registrar_log("Vários", total_itens, "Pedido Compra", f"Forn: {forn_sel} | Valor: R$ {total_valor:.2f}")
+            from estoque.documentos import criar_pdf_pedido, criar_xlsx
+            chave = chave_documento("pedido", forn_sel, round(float(total_valor), 2), itens_compra)
+            exportar(chave, (criar_pdf_pedido, (itens_compra, forn_sel, total_valor)), (criar_xlsx, (itens_compra, 'Pedido')))
+            # clique repetido no mesmo pedido não gera nem registra de novo
+            if st.session_state['pedido_job'] != chave: registrar_log("Vários", total_itens, "Pedido Compra", f"Forn: {forn_sel} | Valor: R$ {total_valor:.2f}")
+            st.session_state['pedido_job'] = chave
             st.rerun()
 
-    if st.session_state.get('pedido_pdf'):
-        c_act2.download_button("⬇️ Baixar PDF", st.session_state['pedido_pdf'], "Pedido_Compra.pdf", "application/pdf")
-        c_act3.download_button("⬇️ Baixar Excel", st.session_state['pedido_xlsx'], "Pedido_Compra.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    if st.session_state.get('pedido_job'):
+        botoes_exportacao(st.session_state['pedido_job'], "Pedido_Compra", c_act2, c_act3)
 
 
 # =================================================================================
 # 🚚 TRANSFERÊNCIA
 # =================================================================================
-elif tela == "Transferencia":
+def tela_transferencia():
+    df_db = carregar_dados()
     st.header("🚚 Transferência / Montagem de Carga")
     col_esquerda, col_direita = st.columns([1.5, 1])
     with col_esquerda:
         with st.container(border=True):
             st.markdown("### 1. Adicionar Itens")
-            lojas_opcoes = ["Hospital Santo Amaro", "Hospital Santa Izabel"]
+            reg = unidades(); col_central = reg.central.coluna_estoque
+            lojas_opcoes = [u.nome for u in reg.destinos]
             destino_sel = st.selectbox("Para onde vai?", lojas_opcoes)
             if destino_sel != st.session_state.get('transf_last_dest'):
                 st.session_state['transf_df_cache'] = None
                 st.session_state['transf_key_ver'] = st.session_state.get('transf_key_ver', 0) + 1
                 st.session_state['transf_last_dest'] = destino_sel
-            if "Amaro" in destino_sel: col_estoque_loja = "Estoque_SA"; col_minimo = "Min_SA"
-            else: col_estoque_loja = "Estoque_SI"; col_minimo = "Min_SI"
+            col_estoque_loja = coluna_destino(destino_sel, reg); col_minimo = coluna_minimo(destino_sel, reg)
             
+            base_transf = st.radio("Base da Sugestão:", ["Meta - Estoque", "Previsão de Demanda"], horizontal=True, key="transf_base")
             if st.button("🪄 Preencher Sugestão"):
-                df_calc = df_db[['Produto', 'Estoque_Central', col_estoque_loja, col_minimo]].copy()
-                df_calc['Sugestao'] = df_calc[col_minimo] - df_calc[col_estoque_loja]
-                df_calc['Sugestao'] = df_calc['Sugestao'].apply(lambda x: max(0, int(x)))
-                df_calc['➡️ Enviar'] = df_calc[['Sugestao', 'Estoque_Central']].min(axis=1).astype(int)
-                st.session_state['transf_df_cache'] = df_calc
+                necessidade = sugestao_por_unidade(previsao_atual(), destino_sel) if base_transf == "Previsão de Demanda" else None
+                st.session_state['transf_df_cache'] = sugestao_transferencia(df_db, destino_sel, necessidade, reg)
                 st.session_state['transf_key_ver'] += 1
                 st.success("Preenchido!"); st.rerun()
 
-            if st.session_state.get('transf_df_cache') is not None: df_view = st.session_state['transf_df_cache'].copy()
+            if st.session_state.get('transf_df_cache') is not None: df_view = st.session_state['transf_df_cache']
             else:
-                df_view = df_db[['Produto', 'Estoque_Central', col_estoque_loja, col_minimo]].copy()
+                df_view = df_db[['Produto', col_central, col_estoque_loja, col_minimo]]
                 df_view['➡️ Enviar'] = 0
             
             busca = st.text_input("🔍 Buscar:", "")
-            if busca: df_view = df_view[df_view['Produto'].str.contains(busca, case=False, na=False)]
+            if busca: df_view = indice_busca().filtrar(df_view, busca)
             
             edited_df = st.data_editor(
                 df_view,
-                column_config={"Produto": st.column_config.TextColumn(disabled=True), "Estoque_Central": st.column_config.NumberColumn("Central", disabled=True, format="%d"), col_estoque_loja: st.column_config.NumberColumn("Loja", disabled=True, format="%d"), col_minimo: st.column_config.NumberColumn("Meta", disabled=True, format="%d"), "➡️ Enviar": st.column_config.NumberColumn(min_value=0, step=1, format="%d"), "Sugestao": None},
+                column_config={"Produto": st.column_config.TextColumn(disabled=True), col_central: st.column_config.NumberColumn("Central", disabled=True, format="%d"), col_estoque_loja: st.column_config.NumberColumn("Loja", disabled=True, format="%d"), col_minimo: st.column_config.NumberColumn("Meta", disabled=True, format="%d"), "➡️ Enviar": st.column_config.NumberColumn(min_value=0, step=1, format="%d"), "Sugestao": None},
                 use_container_width=True, hide_index=True, height=400, key=f"editor_transf_{st.session_state['transf_key_ver']}"
             )
             
@@ -309,74 +268,55 @@ elif tela == "Transferencia":
                 itens_enviar = edited_df[edited_df['➡️ Enviar'] > 0]
                 if itens_enviar.empty: st.warning("Vazio.")
                 else:
-                    erro = False; temp_lista = []
-                    for idx, row in itens_enviar.iterrows():
-                        prod = row['Produto']; qtd = int(row['➡️ Enviar'])
-                        idx_db = df_db[df_db['Produto'] == prod].index[0]
-                        saldo_real = df_db.at[idx_db, 'Estoque_Central']
-                        if qtd > saldo_real: st.error(f"Erro: {prod} só tem {int(saldo_real)}."); erro = True; break
-                        df_db.at[idx_db, 'Estoque_Central'] -= qtd
-                        if "Amaro" in destino_sel: df_db.at[idx_db, 'Estoque_SA'] += qtd
-                        else: df_db.at[idx_db, 'Estoque_SI'] += qtd
-                        registrar_log(prod, qtd, "Transferência", f"Central -> {destino_sel}")
-                        temp_lista.append({"Destino": destino_sel, "Produto": prod, "Quantidade": qtd})
-                    if not erro:
-                        salvar_banco(df_db); st.session_state['carga_acumulada'].extend(temp_lista); st.session_state['transf_df_cache'] = None; st.session_state['transf_key_ver'] += 1; st.success(f"{len(temp_lista)} adicionados!"); st.rerun()
+                    novas = [{"Destino": destino_sel, "Produto": p, "Quantidade": int(q)} for p, q in zip(itens_enviar['Produto'], itens_enviar['➡️ Enviar'])]
+                    # validada de novo a cada tentativa: o saldo do Central pode ter mudado
+                    _, faltas = gravar(lambda df: transferir(df, novas, carregar_indice(), reg))
+                    if not faltas.empty:
+                        for f in faltas.itertuples(): st.error(f"Erro: {f.Produto} só tem {int(f.Saldo)}.")
+                    else:
+                        registrar_logs(linhas_log(novas, unidades=reg)); st.session_state['carga_acumulada'].adicionar(novas); st.session_state['transf_df_cache'] = None; st.session_state['transf_key_ver'] += 1; st.success(f"{len(novas)} adicionados!"); st.rerun()
 
     with col_direita:
         with st.container(border=True):
             st.markdown("### 2. Carga Completa")
             if len(st.session_state['carga_acumulada']) > 0:
+                carga = st.session_state['carga_acumulada']
                 with st.expander("❌ Remover Item"):
-                    lista_display = [f"{i} | {d['Produto']} -> {d['Destino']} ({d['Quantidade']})" for i, d in enumerate(st.session_state['carga_acumulada'])]
-                    itens_remover = st.multiselect("Selecione:", lista_display)
+                    itens_remover = st.multiselect("Selecione:", list(carga.itens), format_func=lambda i: f"{i} | {carga.itens[i]['Produto']} -> {carga.itens[i]['Destino']} ({carga.itens[i]['Quantidade']})")
                     if st.button("Confirmar Remoção"):
-                        indices = [int(s.split(" | ")[0]) for s in itens_remover]
-                        for idx in indices:
-                            item = st.session_state['carga_acumulada'][idx]
-                            p = item['Produto']; q = item['Quantidade']; dest = item['Destino']
-                            idx_db = df_db[df_db['Produto'] == p].index
-                            if not idx_db.empty:
-                                i_db = idx_db[0]; df_db.at[i_db, 'Estoque_Central'] += q 
-                                if "Amaro" in dest: df_db.at[i_db, 'Estoque_SA'] -= q
-                                else: df_db.at[i_db, 'Estoque_SI'] -= q
-                        st.session_state['carga_acumulada'] = [val for i, val in enumerate(st.session_state['carga_acumulada']) if i not in indices]
-                        salvar_banco(df_db); st.success("Estornado!"); st.rerun()
-
-                df_carga = pd.DataFrame(st.session_state['carga_acumulada'])
+                        removidos = [carga.itens[i] for i in itens_remover if i in carga.itens]
+                        gravar(lambda df: (aplicar_carga(df, removidos, carregar_indice(), sinal=-1, unidades=reg), None))
+                        carga.remover(itens_remover); registrar_logs(linhas_log(removidos, estorno=True, unidades=reg)); st.success("Estornado!"); st.rerun()
+
+                df_carga = carga.frame(); df_pivot = None
                 try: 
                     df_pivot = df_carga.pivot_table(index='Produto', columns='Destino', values='Quantidade', aggfunc='sum', fill_value=0).reset_index()
                     st.dataframe(df_pivot, use_container_width=True, hide_index=True, height=300)
                 except: st.dataframe(df_carga, use_container_width=True)
                 
                 c_btn1, c_btn2 = st.columns(2)
+                chave_romaneio = chave_documento("romaneio", reg, df_carga)
                 if c_btn1.button("✅ Finalizar"):
-                    try:
-                        pdf_bytes = criar_pdf_unificado(st.session_state['carga_acumulada'])
-                        st.session_state['romaneio_pdf'] = pdf_bytes
-                        buf = io.BytesIO()
-                        with pd.ExcelWriter(buf, engine='openpyxl') as writer: 
-                            try: df_pivot.to_excel(writer, index=False, sheet_name='Romaneio')
-                            except: df_carga.to_excel(writer, index=False, sheet_name='Romaneio')
-                        st.session_state['romaneio_xlsx'] = buf.getvalue()
-                        st.rerun()
-                    except: st.error("Erro ao gerar arquivos.")
+                    from estoque.documentos import criar_pdf_unificado, criar_xlsx
+                    exportar(chave_romaneio, (criar_pdf_unificado, (carga.linhas(), df_pivot, reg)), (criar_xlsx, (df_carga if df_pivot is None else df_pivot, 'Romaneio')))
+                    st.session_state['romaneio_job'] = chave_romaneio
+                    st.rerun()
                 if c_btn2.button("🗑️ Limpar"):
-                    st.session_state['carga_acumulada'] = []; st.session_state['romaneio_pdf'] = None; st.rerun()
+                    st.session_state['carga_acumulada'] = Carga(); st.session_state['romaneio_job'] = None; st.rerun()
                 
-                if st.session_state['romaneio_pdf']:
-                    st.success("Pronto!")
+                # a carga mudou depois do Finalizar: os arquivos antigos não valem mais
+                if st.session_state['romaneio_job'] == chave_romaneio:
                     c_d1, c_d2 = st.columns(2)
-                    c_d1.download_button("📄 PDF", st.session_state['romaneio_pdf'], "Romaneio.pdf", "application/pdf")
-                    c_d2.download_button("📊 Excel", st.session_state['romaneio_xlsx'], "Romaneio.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                    if botoes_exportacao(chave_romaneio, "Romaneio", c_d1, c_d2, ("📄 PDF", "📊 Excel")): st.success("Pronto!")
             else: st.info("Vazia.")
 
 # =================================================================================
 # 📦 TELA DE ESTOQUE (MANTIDA)
 # =================================================================================
-elif tela == "Estoque":
+def tela_estoque():
+    df_db = carregar_dados()
     st.header("📦 Atualização de Estoque (Contagem)")
-    locais = {"Depósito Geral (Central)": "Estoque_Central", "Hospital Santo Amaro": "Estoque_SA", "Hospital Santa Izabel": "Estoque_SI"}
+    locais = {u.nome: u.coluna_estoque for u in unidades()}
     c_loc, _ = st.columns([1,2])
     loc_sel = c_loc.selectbox("Local:", list(locais.keys()))
     col_dest = locais[loc_sel]
@@ -385,46 +325,28 @@ elif tela == "Estoque":
         arq = st.file_uploader("Arquivo", type=["xlsx", "csv"], key="up_est")
         if arq:
             try:
-                if arq.name.endswith('.csv'): df_t = pd.read_csv(arq, header=None)
-                else: df_t = pd.read_excel(arq, header=None)
-                hr = 0
-                for i, r in df_t.head(20).iterrows():
-                    if any("código" in str(x).lower() or "produto" in str(x).lower() for x in r.values): 
-                        hr = i; break
-                arq.seek(0)
-                if arq.name.endswith('.csv'): df_n = pd.read_csv(arq, header=hr)
-                else: df_n = pd.read_excel(arq, header=hr)
-                cols = df_n.columns.tolist()
+                planilha = PlanilhaContagem(arq)
+                cols = planilha.colunas
                 c1, c2, c3 = st.columns(3)
-                ic = next((i for i,c in enumerate(cols) if "cod" in str(c).lower()),0)
-                inm = next((i for i,c in enumerate(cols) if "nom" in str(c).lower() or "prod" in str(c).lower()),0)
-                iq = next((i for i,c in enumerate(cols) if "qtd" in str(c).lower() or "sald" in str(c).lower()),0)
+                ic, inm, iq = planilha.colunas_sugeridas()
                 cc = c1.selectbox("Col Código", cols, index=ic); cn = c2.selectbox("Col Nome", cols, index=inm); cq = c3.selectbox("Col Qtd", cols, index=iq)
                 if st.button("🚀 Processar"):
-                    att = 0; novos = []
-                    bar = st.progress(0)
-                    for i, r in df_n.iterrows():
-                        bar.progress((i+1)/len(df_n))
-                        cod = str(r[cc]).strip(); nom = str(r[cn]).strip(); qtd = limpar_numero(r[cq])
-                        if not nom or nom=='nan': continue
-                        m = df_db[(df_db['Codigo']==cod)|(df_db['Codigo_Unico']==cod)]
-                        if m.empty: m = df_db[df_db['Produto']==nom]
-                        if not m.empty: df_db.at[m.index[0], col_dest] = qtd; att+=1
-                        else:
-                            n = {"Codigo": cod, "Produto": nom, "Categoria": "Novo", "Fornecedor": "Geral", "Padrao": "Un", "Custo": 0, "Min_SA":0, "Min_SI":0, "Estoque_Central":0, "Estoque_SA":0, "Estoque_SI":0}
-                            n[col_dest] = qtd; df_db = pd.concat([df_db, pd.DataFrame([n])], ignore_index=True); novos.append(nom)
-                    salvar_banco(df_db); bar.empty(); st.success(f"{att} Atualizados!"); 
-                    if novos: st.warning(f"{len(novos)} Novos cadastrados.")
+                    bar = st.progress(0.0)
+                    df_db, rel = gravar(lambda df: importar_contagem_em_blocos(df, planilha.blocos(), cc, cn, cq, col_dest, carregar_indice().copia(),
+                                                                               progresso=lambda f, n: bar.progress(f, text=f"{n} linhas lidas")))
+                    registrar_logs(linhas_contagem(df_db, rel, col_dest, loc_sel)); bar.empty(); st.success(f"{len(rel.atualizados)} Atualizados!")
+                    if rel.novos: st.warning(f"{len(rel.novos)} Novos cadastrados.")
             except Exception as e: st.error(f"Erro: {e}")
     st.divider()
     filt = st.text_input("Filtrar:", placeholder="Nome...")
-    v = df_db[df_db['Produto'].str.contains(filt, case=False, na=False)] if filt else df_db
+    v = indice_busca().filtrar(df_db, filt) if filt else df_db
     st.dataframe(v[['Codigo', 'Produto', 'Padrao', col_dest]], use_container_width=True, hide_index=True)
 
 # =================================================================================
 # 📋 TELA DE PRODUTOS
 # =================================================================================
-elif tela == "Produtos":
+def tela_produtos():
+    df_db = carregar_dados()
     st.header("📋 Cadastro Geral")
     with st.expander("📂 Importar Cadastro Mestre"):
         c_upl, c_cat = st.columns([2, 1])
@@ -434,25 +356,8 @@ elif tela == "Produtos":
             try:
                 if arq.name.endswith('.csv'): df_n = pd.read_csv(arq)
                 else: df_n = pd.read_excel(arq)
-                cols = df_n.columns
-                def fnd(k): 
-                    for c in cols: 
-                        if any(x in c.lower() for x in k): return c
-                    return None
-                cc = fnd(['código','codigo']); cn = fnd(['produto 1','nome']); cf = fnd(['fornec']); cp = fnd(['padr']); ccst = fnd(['cust']); cma = fnd(['amaro']); cmi = fnd(['izabel'])
-                cnt=0
-                for i, r in df_n.iterrows():
-                    p = str(r[cn]).strip()
-                    if not p or p=='nan': continue
-                    d = {"Codigo": str(r[cc]) if cc else "", "Produto": p, "Categoria": cat, "Fornecedor": str(r[cf]) if cf else "", "Padrao": str(r[cp]) if cp else "", "Custo": limpar_numero(r[ccst]) if ccst else 0, "Min_SA": limpar_numero(r[cma]) if cma else 0, "Min_SI": limpar_numero(r[cmi]) if cmi else 0}
-                    m = df_db['Produto']==p
-                    if m.any(): 
-                        for k,v in d.items(): df_db.loc[m, k] = v
-                    else: 
-                        d.update({"Estoque_Central":0, "Estoque_SA":0, "Estoque_SI":0})
-                        df_db = pd.concat([df_db, pd.DataFrame([d])], ignore_index=True)
-                    cnt+=1
-                salvar_banco(df_db); st.success(f"{cnt} processados!"); st.rerun()
+                _, rel = gravar(lambda df: importar_cadastro(df, df_n, cat, carregar_indice().copia(), unidades()))
+                st.success(f"{rel.processados} processados!"); st.rerun()
             except Exception as e: st.error(f"Erro: {e}")
             
     st.divider()
@@ -460,23 +365,144 @@ elif tela == "Produtos":
     # BOTÃO ZONA DE PERIGO
     with st.expander("🔥 Apagar Tudo"):
         if st.button("🗑️ ZERAR BANCO"):
-            colunas_limpas = ["Codigo", "Codigo_Unico", "Produto", "Produto_Alt", "Categoria", "Fornecedor", "Padrao", "Custo", "Min_SA", "Min_SI", "Estoque_Central", "Estoque_SA", "Estoque_SI"]
-            salvar_banco(pd.DataFrame(columns=colunas_limpas)); st.success("Zerado!"); st.rerun()
+            gravar(lambda df: (df.iloc[0:0], None)); st.success("Zerado!"); st.rerun()
+
+    with st.expander("🏥 Unidades"):
+        st.dataframe(pd.DataFrame([{"Código": u.codigo, "Nome": u.nome, "Palavras-chave": ", ".join(u.palavras), "Central": "✔" if u.central else ""} for u in unidades()]),
+                     use_container_width=True, hide_index=True)
+        u1, u2, u3, u4 = st.columns([1, 2, 2, 1])
+        cod_u = u1.text_input("Código:", placeholder="SJ"); nome_u = u2.text_input("Nome:", placeholder="Hospital São José")
+        palavras_u = u3.text_input("Palavras-chave:", placeholder="josé, jose"); curto_u = u4.text_input("Nome curto:", placeholder="S. José")
+        if st.button("➕ Cadastrar Unidade"):
+            try:
+                sistema().adicionar_unidade(nova_unidade(cod_u, nome_u, palavras_u, curto_u))
+                st.success("Unidade cadastrada!"); st.rerun()
+            except ValueError as e: st.warning(str(e))
+
+    with st.expander("💾 Memória"):
+        rel = derivado("memoria", relatorio_memoria)
+        total, sem = rel.loc["Total", "Bytes"], rel.loc["Total", "Bytes_Sem_Esquema"]
+        st.caption(f"Cadastro em memória: {total / 2**20:.1f} MB ({sem / 2**20:.1f} MB sem os tipos compactos).")
+        st.dataframe(rel, use_container_width=True)
 
     a1, a2, a3 = st.tabs(["☕ Café", "🍎 Perecíveis", "📋 Todos"])
     def show(c):
-        d = df_db if c=="Todos" else df_db[df_db['Categoria']==c]
+        d = df_db if c=="Todos" else derivado(("categoria", c), lambda f: f[f['Categoria']==c])
         if not d.empty:
             st.dataframe(d[['Codigo','Produto','Fornecedor','Padrao','Custo']].style.format({"Custo": "R$ {:.2f}"}), use_container_width=True, hide_index=True)
             cd1, cd2 = st.columns([4,1])
             sel = cd1.selectbox(f"Excluir ({c})", d['Produto'].unique(), key=f"d_{c}", index=None)
             if sel and cd2.button("🗑️", key=f"b_{c}"):
-                salvar_banco(df_db[df_db['Produto']!=sel]); st.rerun()
+                gravar(lambda df: (df[df['Produto'] != sel], None)); st.rerun()
         else: st.info("Vazio")
     with a1: show("Café"); 
     with a2: show("Perecíveis"); 
     with a3: show("Todos")
 
 # --- OUTRAS TELAS ---
-elif tela == "Vendas": st.title("📉 Vendas"); st.info("Em breve...")
-elif tela == "Sugestoes": st.title("💡 Sugestões"); st.info("Em breve...")
+
+# =================================================================================
+# 📉 VENDAS / CONSUMO
+# =================================================================================
+def tela_vendas():
+    carregar_dados()
+    st.header("📉 Consumo por Unidade")
+    import plotly.express as px
+    motor = sistema().motor_consumo(unidades()); motor.atualizar()
+    res = motor.resumo()
+    
+    f1, f2 = st.columns([2, 1])
+    prod = f1.selectbox("Produto:", ["Todos"] + sorted(res['Produto'].dropna().unique()))
+    uni = f2.selectbox("Unidade:", ["Todas"] + sorted(res['Unidade'].dropna().unique()))
+    
+    serie = motor.semanal(None if prod == "Todos" else prod, None if uni == "Todas" else uni)
+    if serie.empty: st.info("Sem contagens ou transferências registradas para o filtro.")
+    else:
+        g1, g2 = st.columns(2)
+        g1.plotly_chart(px.bar(serie, x="Semana", y="Consumo", color="Unidade", barmode="group", title="Consumo semanal"), use_container_width=True)
+        g2.plotly_chart(px.line(serie, x="Semana", y="Entradas", color="Unidade", markers=True, title="Transferências líquidas por semana"), use_container_width=True)
+    
+    st.divider()
+    v = res
+    if prod != "Todos": v = v[v['Produto'] == prod]
+    if uni != "Todas": v = v[v['Unidade'] == uni]
+    st.dataframe(v.rename(columns={"Consumo_Semana": f"Consumo/Semana ({SEMANAS_MEDIA} sem.)", "Ultima_Contagem": "Última Contagem",
+                                   "Data_Contagem": "Data Contagem", "Media_Vendas_Semana": "Média Ref. (planilha)"}),
+                 use_container_width=True, hide_index=True)
+
+# =================================================================================
+# 💡 SUGESTÕES (PREVISÃO DE DEMANDA)
+# =================================================================================
+def tela_sugestoes():
+    carregar_dados()
+    st.header("💡 Previsão de Demanda e Ponto de Pedido")
+    par = st.session_state['previsao_param']
+    
+    with st.expander("⚙️ Parâmetros"):
+        p1, p2, p3, p4 = st.columns(4)
+        metodo = p1.selectbox("Método:", ["suavizacao", "media"], index=["suavizacao", "media"].index(par.metodo),
+                              format_func=lambda m: "Suavização Exponencial" if m == "suavizacao" else "Média Móvel")
+        janela = p1.number_input("Janela (semanas):", 1, 52, par.janela)
+        alfa = p2.slider("Alfa:", 0.05, 0.95, par.alfa, 0.05)
+        nivel = p2.slider("Nível de Serviço:", 0.50, 0.99, par.nivel_servico, 0.01)
+        prazo_c = p3.number_input("Prazo Fornecedor (sem.):", 0.0, 26.0, par.prazo_compra, 0.5)
+        prazo_t = p3.number_input("Prazo Transferência (sem.):", 0.0, 8.0, par.prazo_transferencia, 0.5)
+        revisao = p4.number_input("Intervalo entre Pedidos (sem.):", 0.5, 26.0, par.revisao, 0.5)
+        semanas = p4.number_input("Histórico (semanas):", 4, 104, par.semanas)
+        novo = ParametrosPrevisao(metodo, int(janela), int(semanas), float(alfa), float(nivel), float(prazo_c), float(prazo_t), float(revisao))
+        if novo != par: st.session_state['previsao_param'] = novo; st.rerun()
+    
+    prev = previsao_atual()
+    f1, f2, f3 = st.columns([1, 2, 1])
+    uni = f1.selectbox("Unidade:", [u.nome for u in unidades()])
+    busca = f2.text_input("🔍 Buscar:", "")
+    so_repor = f3.checkbox("Só com sugestão", value=True)
+    v = prev[prev['Unidade'] == uni]
+    if busca: v = indice_busca().filtrar(v, busca, coluna='rot')
+    if so_repor: v = v[v['Sugestao'] > 0]
+    
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Itens a Repor", int((v['Sugestao'] > 0).sum()))
+    m2.metric("Unidades Sugeridas", int(v['Sugestao'].sum()))
+    m3.metric("Sem Histórico", int((v['Origem'] != "Histórico").sum()))
+    st.caption("Central = compra para a rede (demanda somada dos hospitais, estoque de todas as unidades).")
+    st.dataframe(v.drop(columns=['rot', 'Unidade']), use_container_width=True, hide_index=True, height=500,
+                 column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ['Demanda_Media', 'Demanda_Suavizada', 'Demanda', 'Desvio', 'Seguranca', 'Ponto_Pedido', 'Estoque_Alvo']})
+
+# =================================================================================
+# 📜 HISTÓRICO
+# =================================================================================
+def tela_historico():
+    st.header("📜 Histórico de Movimentações")
+    hist = sistema().historico()
+    
+    f1, f2, f3, f4 = st.columns([2, 1, 1, 2])
+    prod = f1.selectbox("Produto:", ["Todos"] + hist.valores("Produto"))
+    tipo = f2.selectbox("Tipo:", ["Todos"] + hist.valores("Tipo"))
+    usuario = f3.selectbox("Usuário:", ["Todos"] + hist.valores("Usuario"))
+    periodo = f4.date_input("Período:", (date.today() - timedelta(days=90), date.today()))
+    inicio, fim = (periodo[0], periodo[-1]) if periodo else (None, None)
+    filtros = {"produto": None if prod == "Todos" else prod, "tipo": None if tipo == "Todos" else tipo, "inicio": inicio, "fim": fim}
+    
+    # filtro novo volta para a página 1
+    pagina = st.number_input("Página:", min_value=1, value=1, step=1, key=f"hist_pag_{prod}_{tipo}_{usuario}_{inicio}_{fim}")
+    filtros_ev = dict(filtros, usuario=None if usuario == "Todos" else usuario)
+    res = hist.consultar(pagina=int(pagina), **filtros_ev)
+    if res.pagina > res.paginas: res = hist.consultar(pagina=res.paginas, **filtros_ev)
+    st.caption(f"{res.total} eventos | Página {res.pagina} de {res.paginas}")
+    st.dataframe(res.linhas, use_container_width=True, hide_index=True)
+    
+    with st.expander("📊 Totais por Dia"):
+        agg = hist.agregados_diarios(**filtros)
+        if agg.empty: st.info("Vazio")
+        else: st.dataframe(agg, use_container_width=True, hide_index=True)
+
+# =================================================================================
+# DESPACHO: só a tela ativa roda em cada execução do script
+# =================================================================================
+TELAS = {"Compras": tela_compras, "Transferencia": tela_transferencia, "Estoque": tela_estoque, "Produtos": tela_produtos,
+         "Vendas": tela_vendas, "Sugestoes": tela_sugestoes, "Historico": tela_historico}
+
+tela = st.session_state.get('tela_atual', "Estoque")
+# conta também as execuções que terminam em st.rerun()/st.stop()
+with METRICAS.medir("tela", tela): TELAS.get(tela, tela_estoque)()
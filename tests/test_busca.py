@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from estoque.busca import IndiceBusca
+
+NOMES = ["ÁGUA MINERAL 330ML", "CAFÉ 1KG", "AÇÚCAR CRISTAL 5KG", "ALCOOL 70%", "SUCO UVA 1L", "PAPEL TOALHA"]
+
+
+@pytest.fixture
+def indice():
+    return IndiceBusca(pd.DataFrame({"Produto": NOMES}, index=range(10, 10 + len(NOMES))))
+
+
+def _nomes(indice, consulta):
+    return [NOMES[i] for i in indice.posicoes(consulta)]
+
+
+@pytest.mark.parametrize("consulta, esperados", [
+    ("ml", ["ÁGUA MINERAL 330ML"]),
+    ("kg", ["CAFÉ 1KG", "AÇÚCAR CRISTAL 5KG"]),
+    ("ua", ["ÁGUA MINERAL 330ML"]),
+    ("%", ["ALCOOL 70%"]),
+    ("1l", ["SUCO UVA 1L"]),
+])
+def test_termo_curto_no_meio_da_palavra(indice, consulta, esperados):
+    assert sorted(_nomes(indice, consulta)) == sorted(esperados)
+
+
+def test_termo_curto_prefere_comeco_de_palavra(indice):
+    # "al": começo de ALCOOL vem antes do meio de MINERAL, CRISTAL e TOALHA
+    achados = _nomes(indice, "al")
+    assert achados[0] == "ALCOOL 70%"
+    assert sorted(achados[1:]) == sorted(["ÁGUA MINERAL 330ML", "AÇÚCAR CRISTAL 5KG", "PAPEL TOALHA"])
+
+
+def test_termo_curto_nao_atravessa_nomes(indice):
+    # fim de "1KG" + começo de "AÇÚCAR" não formam "ga"
+    assert _nomes(indice, "ga") == []
+
+
+def test_acentos_e_varios_termos(indice):
+    assert _nomes(indice, "agua") == ["ÁGUA MINERAL 330ML"]
+    assert _nomes(indice, "acucar kg") == ["AÇÚCAR CRISTAL 5KG"]
+    assert list(indice.rotulos("cafe")) == [11]
+
+
+def test_indice_vazio():
+    assert len(IndiceBusca(pd.DataFrame({"Produto": []})).posicoes("ml")) == 0
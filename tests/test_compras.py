@@ -0,0 +1,26 @@
+import pandas as pd
+
+from estoque.compras import MotorSugestao
+
+
+def _cadastro(estoque):
+    return pd.DataFrame({"Produto": ["A", "B"], "Fornecedor": ["F1", "F2"], "Padrao": "Un", "Custo": [1.0, 2.0],
+                         "Min_SA": [10, 10], "Estoque_Central": estoque})
+
+
+def test_sessao_atrasada_nao_volta_a_versao():
+    motor = MotorSugestao()
+    motor.sincronizar(_cadastro([2, 4]), 5)
+    motor.sincronizar(_cadastro([0, 0]), 4)
+    versao, fatia = motor.sugestao("Todos")
+    assert versao == 5
+    assert fatia["Qtd Compra"].tolist() == [8, 6]
+
+
+def test_versao_nova_recalcula_so_o_que_mudou():
+    motor = MotorSugestao()
+    motor.sincronizar(_cadastro([2, 4]), 1)
+    motor.sincronizar(_cadastro([2, 9]), 2)
+    versao, fatia = motor.sugestao("F2")
+    assert versao == 2
+    assert fatia["Qtd Compra"].tolist() == [1]
@@ -0,0 +1,48 @@
+import threading
+
+from estoque.historico import IndiceHistorico
+from estoque.log import LogEventos, nova_linha
+
+
+def _registrar(log, produto):
+    log.registrar([nova_linha(produto, 1, "Compra", "Fornecedor")])
+
+
+def _produtos(indice):
+    return sorted(indice.consultar(por_pagina=1000).linhas["Produto"])
+
+
+def test_sincronizacao_incremental_com_rotacao(tmp_path):
+    log = LogEventos(str(tmp_path / "historico_log.csv"), tamanho_segmento=200)
+    indice = IndiceHistorico(log)
+    esperados = []
+    for i in range(30):
+        _registrar(log, f"P{i:02d}"); esperados.append(f"P{i:02d}")
+        if i % 4 == 0: indice.sincronizar()
+    assert len(log.segmentos()) > 3
+    assert _produtos(indice) == esperados
+
+
+def test_rotacao_durante_sincronizacao(tmp_path, monkeypatch):
+    # a cada segmento novo o log rotaciona; outro escritor grava (e rotaciona) logo depois da listagem
+    log = LogEventos(str(tmp_path / "historico_log.csv"), tamanho_segmento=1)
+    indice = IndiceHistorico(log)
+    esperados, escritores = [], []
+    for i in range(3):
+        _registrar(log, f"P{i}"); esperados.append(f"P{i}"); indice.sincronizar()
+
+    listar = LogEventos.segmentos
+    def segmentos_e_rotacao(self):
+        lista = listar(self)
+        produto = f"R{len(escritores)}"; esperados.append(produto)
+        t = threading.Thread(target=_registrar, args=(self, produto)); t.start(); escritores.append(t)
+        t.join(0.2)   # sem a trava do log, a rotação acontece aqui, entre a listagem e a leitura
+        return lista
+    monkeypatch.setattr(LogEventos, "segmentos", segmentos_e_rotacao)
+    for i in range(3, 6):
+        _registrar(log, f"P{i}"); esperados.append(f"P{i}"); indice.sincronizar()
+    monkeypatch.undo()
+    for t in escritores: t.join()
+
+    assert _produtos(indice) == sorted(esperados)
+    assert sorted(log.ler()["Produto"]) == sorted(esperados)
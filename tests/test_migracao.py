@@ -0,0 +1,60 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from estoque.armazenamento import abrir_banco, migrar_csv_para_sqlite
+from estoque.benchmark import cadastro_sintetico
+from estoque.sistema import Configuracao, abrir
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# morre com SIGKILL depois de criar o schema e antes de gravar os produtos
+MIGRACAO_MORTA = """
+import os, signal, sys
+from estoque import armazenamento
+def substituir(self, df):
+    with self.conexao(): pass
+    os.kill(os.getpid(), signal.SIGKILL)
+armazenamento.ArmazenamentoSQLite.substituir = substituir
+armazenamento.migrar_csv_para_sqlite(sys.argv[1], sys.argv[2])
+"""
+
+
+@pytest.fixture
+def config(tmp_path):
+    cadastro_sintetico(300).to_csv(tmp_path / "banco_dados.csv", index=False)
+    return Configuracao(arquivo_dados=str(tmp_path / "banco_dados.csv"), arquivo_banco=str(tmp_path / "banco_dados.db"),
+                        arquivo_log=str(tmp_path / "historico_log.csv"))
+
+
+def test_migracao_completa(config):
+    assert len(abrir(config).carregar()) == 300
+    assert not os.path.exists(config.arquivo_banco + ".tmp")
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGKILL"), reason="precisa de SIGKILL")
+def test_migracao_interrompida_nao_deixa_banco_vazio(config):
+    r = subprocess.run([sys.executable, "-c", MIGRACAO_MORTA, config.arquivo_dados, config.arquivo_banco],
+                       cwd=RAIZ, env={**os.environ, "PYTHONPATH": RAIZ})
+    assert r.returncode == -signal.SIGKILL
+    assert not os.path.exists(config.arquivo_banco)
+    # o próximo start migra de novo, por cima da sobra em .tmp
+    assert len(abrir(config).carregar()) == 300
+
+
+def test_migracao_falha_limpa_temporario(config, monkeypatch):
+    def falhar(self, df): raise RuntimeError("disco cheio")
+    monkeypatch.setattr("estoque.armazenamento.ArmazenamentoSQLite.substituir", falhar)
+    with pytest.raises(RuntimeError):
+        migrar_csv_para_sqlite(config.arquivo_dados, config.arquivo_banco)
+    assert not any(os.path.exists(config.arquivo_banco + s) for s in ("", ".tmp", ".tmp-wal"))
+
+
+def test_nao_migra_por_cima_de_banco_existente(config):
+    migrar_csv_para_sqlite(config.arquivo_dados, config.arquivo_banco)
+    with pytest.raises(FileExistsError):
+        migrar_csv_para_sqlite(config.arquivo_dados, config.arquivo_banco)
+    assert len(abrir_banco("sqlite", config.arquivo_banco).carregar()) == 300